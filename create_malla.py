@@ -4,6 +4,7 @@ import easygui
 import json
 import os
 from typing import Dict, List, Union
+from validationgrid.expresion import unir_condiciones
 
 
 # Función para dejar las condiciones que recibe del Excel de validación en las condiciones como lista de valores o cómo valores únicos según el tipo de dato
@@ -29,6 +30,9 @@ def get_list_condiciones(row:pd.Series):
         # Si el tipo de dato es entero, devuelve la lista de valores en formato entero
         if B == 'int':
             val = [int(i) for i in A.split("|")]
+        # Si la condición es una expresión, devuelve la expresión como cadena
+        elif B == 'expr':
+            val = A
         # Para cualquier otro caso devuelve los datos cómo tipo lista de cadenas de texto
         else:
             val = [str(i) for i in A.split("|")]
@@ -61,7 +65,7 @@ def get_list_valores(row: pd.Series):
         # En el caso que sea de tipo string o listas devuelva la lista de de cadenas de texto
         elif B == 'str' or B=='list' or B == 'listlist':
             val = [str(i) for i in A.split("|")]
-        # Los demas casos (TIPO REGEX) devuelva solo la cadena
+        # Los demas casos (TIPO REGEX y EXPR) devuelva solo la cadena
         else:
             val = A
     return val
@@ -115,8 +119,9 @@ def create_malla_dict(condiciones: pd.DataFrame, valores: pd.DataFrame)-> Dict[s
         guarda en el diccionario de la variable el diccionario con la variable de la que depende y la condición o valor que debe tomar para 
         que se active la pregunta (Dado que una variable puede tener una o más condiciones, en el caso que tenga más de una condición, esta condición
         se va a añadir en el diccionario de la variable)
+        Si el tipo de validación es expr, la condición es una expresión (ver validationgrid/expresion.py) y se guarda como cadena.
         - valores: Ingresa los valores que debe tomar la variable, si no hay valores por validar, devuelve None, caso contrario crea un diccionario donde
-        almacena los valores que puede tomar y el tipo de validación que se va a realizar (int, str, regex, list, listlist)
+        almacena los valores que puede tomar y el tipo de validación que se va a realizar (int, str, regex, list, listlist, expr)
         - iand: Se refiere a la pregunta de si las multiples condiciones a validar son de tipo or o de tipo and, si está vacío significa que es de tipo or por lo que
         devuelve Falso, caso contrario devuelve True.
         - opcional: Se refiere al caso de si la pregunta es opcional, si no es opcional devuelve True, caso contrario devuelve False
@@ -124,13 +129,19 @@ def create_malla_dict(condiciones: pd.DataFrame, valores: pd.DataFrame)-> Dict[s
         caso contrario devuelve False
         """
     
+        # Las condiciones de tipo expresión se guardan como cadena, las demás como diccionario de la variable de la que depende
+        if row['tipo_validacion'] == 'expr':
+            condicion_variable = condicion
+        else:
+            condicion_variable = None if pd.isna(dependiente) else {dependiente : condicion}
+    
         # Si la variable ya tiene una condición se añade la nueva condición
         if variable in malla.keys():
-            malla[variable]['condicion'].update({dependiente : condicion})
+            malla[variable]['condicion'] = unir_condiciones(malla[variable]['condicion'], condicion_variable, malla[variable]['iand'])
         # Creación del diccionario según los parámetros
         else:
             malla[variable] = {
-                'condicion': None if pd.isna(dependiente) else {dependiente : condicion},
+                'condicion': condicion_variable,
                 'valores': None if pd.isna(condicion_valor) else {'valor':valor, 'Tipo': condicion_valor},
                 'iand': False if pd.isna(iand) else True,
                 'opcional': False if pd.isna(opcional) else True,
@@ -0,0 +1,220 @@
+## Prueba de carga de punta a punta de validar_datos contra el servidor de prueba del Sincronizador
+import argparse
+import contextlib
+import io
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+import numpy as np
+import requests
+import validationgrid.read as read
+from validationgrid.servidor_prueba import ServidorSincronizador
+from validar_datos import validar_datos
+
+# resource solo existe en Linux y macOS
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def _memoria_rss_mb()-> Optional[float]:
+    # Memoria residente máxima del proceso, ru_maxrss está en bytes en macOS y en KB en Linux
+    if resource is None:
+        return None
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo / 1e6 if sys.platform == 'darwin' else maximo / 1e3
+
+
+# Último error de solicitar_resultados en cada hilo de la prueba
+_errores_api = threading.local()
+
+
+@contextlib.contextmanager
+def _registrar_errores_api():
+    # validar_datos continúa con una respuesta vacía si la solicitud falla (ver read.get_response), mientras dura la prueba
+    # se guarda el error de la solicitud para clasificar la ejecución por ese error
+    solicitar = read.solicitar_resultados
+    def solicitar_registrando(*args, **kwargs):
+        try:
+            return solicitar(*args, **kwargs)
+        except Exception as e:
+            _errores_api.error = e
+            raise
+    read.solicitar_resultados = solicitar_registrando
+    try:
+        yield
+    finally:
+        read.solicitar_resultados = solicitar
+
+
+def _validar_desde_api(id_encuesta: str, ruta: str, token: Optional[str], url_api: str)-> tuple:
+    # Ejecuta validar_datos contra el API, si la solicitud falló se lanza el error de la solicitud en lugar del resultado
+    # vacío o del error que produce la respuesta vacía más adelante
+    _errores_api.error = None
+    try:
+        resultado = validar_datos(id_encuesta, token, ruta, url_api = url_api)
+    except Exception as e:
+        raise (_errores_api.error or e)
+    if _errores_api.error is not None:
+        raise _errores_api.error
+    return resultado
+
+
+def _tipo_error(error: Exception)-> str:
+    # Las respuestas con error del API se clasifican por su código
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return "HTTPError {}".format(error.response.status_code)
+    return type(error).__name__
+
+
+def prueba_de_carga(id_encuesta: str, ruta: str, solicitudes: int = 5, concurrencia: int = 1, url_api: Optional[str] = None, token: Optional[str] = None,
+                    medir_memoria: bool = True, **configuracion_servidor)-> Dict:
+    """Función que ejecuta validar_datos varias veces contra el API y mide rendimiento, latencia y memoria
+
+    Si no se entrega url_api se inicia un ServidorSincronizador local con configuracion_servidor (hogares, latencia,
+    bytes_por_segundo, por_partes, comprimir, probabilidad_429, probabilidad_error, probabilidad_corte, ...). Los datos
+    del servidor se generan antes de empezar a medir.
+
+    Args:
+        id_encuesta (str): Id de la encuesta, debe existir su malla en data/json
+        ruta (str): Ruta al folder donde esta el proyecto
+        solicitudes (int): Número de ejecuciones de validar_datos
+        concurrencia (int): Número de ejecuciones simultáneas
+        url_api (Optional[str]): Dirección de un API ya disponible, si se entrega no se inicia el servidor local
+        token (Optional[str]): Token de Acceso al API
+        medir_memoria (bool): Si es True se mide la memoria máxima con tracemalloc, lo que hace más lenta la ejecución
+        **configuracion_servidor: Parámetros del ServidorSincronizador
+
+    Returns:
+        Dict: Reporte con rendimiento, percentiles de latencia, memoria máxima, errores y respuestas del servidor
+    """
+    servidor = None
+    if url_api is None:
+        servidor = ServidorSincronizador(ruta, token = token, **configuracion_servidor)
+        tamano_respuesta = len(servidor.contenido(id_encuesta))
+        url_api = servidor.iniciar()
+    else:
+        tamano_respuesta = None
+
+    def ejecutar(_)-> tuple:
+        inicio = time.perf_counter()
+        try:
+            dataframe, validos, novalidos = _validar_desde_api(id_encuesta, ruta, token, url_api)
+            resultado = (dataframe['id'].nunique(), len(validos) + len(novalidos), None)
+        except Exception as e:
+            resultado = (0, 0, _tipo_error(e))
+        return (time.perf_counter() - inicio,) + resultado
+
+    try:
+        if medir_memoria:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        # Se silencian los mensajes de validar_datos durante la prueba
+        with contextlib.redirect_stdout(io.StringIO()), _registrar_errores_api():
+            with ThreadPoolExecutor(max_workers = concurrencia) as executor:
+                ejecuciones = list(executor.map(ejecutar, range(solicitudes)))
+        transcurrido = time.perf_counter() - inicio
+        memoria_pico = tracemalloc.get_traced_memory()[1] / 1e6 if medir_memoria else None
+    finally:
+        if medir_memoria:
+            tracemalloc.stop()
+        if servidor is not None:
+            servidor.detener()
+
+    # El rendimiento y la latencia se calculan solo con las ejecuciones exitosas, las fallidas se reportan aparte
+    exitosas = [i for i in ejecuciones if i[3] is None]
+    fallidas = [i for i in ejecuciones if i[3] is not None]
+    errores = {}
+    for ejecucion in ejecuciones:
+        if ejecucion[3] is not None:
+            errores[ejecucion[3]] = errores.get(ejecucion[3], 0) + 1
+
+    return {
+        'solicitudes': solicitudes,
+        'concurrencia': concurrencia,
+        'exitosas': len(exitosas),
+        'errores': errores,
+        'segundos': transcurrido,
+        'solicitudes_por_segundo': len(exitosas) / transcurrido,
+        'hogares_por_segundo': sum(i[1] for i in exitosas) / transcurrido,
+        'registros_por_segundo': sum(i[2] for i in exitosas) / transcurrido,
+        'mb_por_segundo': tamano_respuesta * len(exitosas) / 1e6 / transcurrido if tamano_respuesta is not None else None,
+        'latencia': _resumen_latencia([i[0] for i in exitosas]),
+        'latencia_fallidas': _resumen_latencia([i[0] for i in fallidas]),
+        'memoria_pico_mb': memoria_pico,
+        'memoria_rss_mb': _memoria_rss_mb(),
+        'respuestas_servidor': servidor.estadisticas() if servidor is not None else None,
+        }
+
+
+def _resumen_latencia(latencias: list)-> Optional[Dict[str, float]]:
+    # Promedio, percentiles y máximo de las latencias, None si no hay ejecuciones
+    if not latencias:
+        return None
+    latencias = np.array(latencias)
+    return {
+        'promedio': float(latencias.mean()),
+        'p50': float(np.percentile(latencias, 50)),
+        'p90': float(np.percentile(latencias, 90)),
+        'p95': float(np.percentile(latencias, 95)),
+        'p99': float(np.percentile(latencias, 99)),
+        'maxima': float(latencias.max()),
+        }
+
+
+def imprimir_reporte(reporte: Dict):
+    """Función que imprime el reporte de la prueba de carga
+
+    Args:
+        reporte (Dict): Reporte de prueba_de_carga
+    """
+    print("PRUEBA DE CARGA")
+    print("Solicitudes: {} ({} simultáneas), exitosas: {}, errores: {}".format(reporte['solicitudes'], reporte['concurrencia'], reporte['exitosas'], reporte['errores'] or 'ninguno'))
+    print("Tiempo total: {:.2f} s".format(reporte['segundos']))
+    print("Rendimiento: {:.2f} solicitudes/s, {:.0f} hogares/s, {:.0f} registros/s".format(reporte['solicitudes_por_segundo'], reporte['hogares_por_segundo'], reporte['registros_por_segundo']))
+    if reporte['mb_por_segundo'] is not None:
+        print("Datos descargados: {:.2f} MB/s".format(reporte['mb_por_segundo']))
+    for nombre, latencia in [('Latencia (s)', reporte['latencia']), ('Latencia de las fallidas (s)', reporte['latencia_fallidas'])]:
+        if latencia is not None:
+            print("{}: promedio {:.3f}, p50 {:.3f}, p90 {:.3f}, p95 {:.3f}, p99 {:.3f}, máxima {:.3f}".format(
+                nombre, latencia['promedio'], latencia['p50'], latencia['p90'], latencia['p95'], latencia['p99'], latencia['maxima']))
+    if reporte['memoria_pico_mb'] is not None:
+        print("Memoria máxima de Python (tracemalloc): {:.1f} MB".format(reporte['memoria_pico_mb']))
+    if reporte['memoria_rss_mb'] is not None:
+        print("Memoria residente máxima del proceso: {:.1f} MB".format(reporte['memoria_rss_mb']))
+    if reporte['respuestas_servidor'] is not None:
+        print("Respuestas del servidor por código: {}".format(reporte['respuestas_servidor']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Prueba de carga de validar_datos contra el servidor de prueba del Sincronizador')
+    parser.add_argument('id_encuesta')
+    parser.add_argument('--ruta', default = '.', help = 'Ruta al folder del proyecto')
+    parser.add_argument('--solicitudes', type = int, default = 5)
+    parser.add_argument('--concurrencia', type = int, default = 1)
+    parser.add_argument('--url-api', default = None, help = 'Dirección de un API ya disponible en lugar del servidor local')
+    parser.add_argument('--hogares', type = int, default = 1000)
+    parser.add_argument('--latencia', type = float, default = 0.0)
+    parser.add_argument('--bytes-por-segundo', type = int, default = None)
+    parser.add_argument('--sin-partes', action = 'store_true', help = 'Enviar con Content-Length en lugar de chunked')
+    parser.add_argument('--comprimir', action = 'store_true')
+    parser.add_argument('--probabilidad-429', type = float, default = 0.0)
+    parser.add_argument('--retry-after', type = float, default = 1.0)
+    parser.add_argument('--probabilidad-error', type = float, default = 0.0)
+    parser.add_argument('--probabilidad-corte', type = float, default = 0.0)
+    parser.add_argument('--sin-memoria', action = 'store_true', help = 'No medir la memoria con tracemalloc')
+    argumentos = parser.parse_args()
+
+    configuracion = {}
+    if argumentos.url_api is None:
+        configuracion = dict(hogares = argumentos.hogares, latencia = argumentos.latencia, bytes_por_segundo = argumentos.bytes_por_segundo,
+                             por_partes = not argumentos.sin_partes, comprimir = argumentos.comprimir, probabilidad_429 = argumentos.probabilidad_429,
+                             retry_after = argumentos.retry_after, probabilidad_error = argumentos.probabilidad_error,
+                             probabilidad_corte = argumentos.probabilidad_corte)
+    reporte = prueba_de_carga(argumentos.id_encuesta, argumentos.ruta, solicitudes = argumentos.solicitudes, concurrencia = argumentos.concurrencia,
+                              url_api = argumentos.url_api, medir_memoria = not argumentos.sin_memoria, **configuracion)
+    imprimir_reporte(reporte)
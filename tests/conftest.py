@@ -0,0 +1,88 @@
+import json
+import pytest
+
+
+def regla(valores = None, opcional = False, condicion = None):
+    return {'condicion': condicion, 'valores': valores, 'iand': False, 'opcional': opcional, 'excluida_PTA': False}
+
+
+def hogar(id_hogar, documentos, **respuestas):
+    integrantes = [{'num_documento': documento, 'identificacion': i} for i, documento in enumerate(documentos)]
+    return {'id': id_hogar, 'respuestas': dict(respuestas, NUMERODOCUMENTOTITULAR = documentos[0], integrante = integrantes)}
+
+
+@pytest.fixture
+def malla_anidada():
+    # actividades es una lista de diccionarios {tipo, monto} que se expande, tipo es obligatoria
+    return {
+        'id': regla(opcional = True),
+        'NUMERODOCUMENTOTITULAR': regla(opcional = True),
+        'num_documento': regla(opcional = True),
+        'actividades': regla(opcional = True),
+        'tipo': regla({'valor': ['1', '2'], 'Tipo': 'list'}),
+        'monto': regla(opcional = True),
+        }
+
+
+@pytest.fixture
+def registros_anidados():
+    # Los hogares 2 y 5 no tienen actividades y el hogar 4 solo tiene la clave tipo, por lo que un lote con solo esos
+    # hogares no crea las columnas tipo y monto
+    return [
+        hogar(0, ['100'], actividades = [{'tipo': '1', 'monto': 10}]),
+        hogar(1, ['101', '111'], actividades = [{'tipo': '3', 'monto': 5}, {'tipo': '2', 'monto': 1}]),
+        hogar(2, ['102']),
+        hogar(3, ['103'], actividades = [{'tipo': '2'}]),
+        hogar(4, ['104'], actividades = [{'tipo': '9'}]),
+        hogar(5, ['105', '115']),
+        ]
+
+
+@pytest.fixture
+def proyecto(tmp_path):
+    # Escribe la malla en data/json como en el proyecto y los registros como un archivo exportado del Sincronizador
+    def crear(malla, registros, id_encuesta = 'prueba'):
+        carpeta = tmp_path / 'data' / 'json'
+        carpeta.mkdir(parents = True, exist_ok = True)
+        (carpeta / f'{id_encuesta}.json').write_text(json.dumps(malla), encoding = 'utf-8')
+        archivo = tmp_path / f'{id_encuesta}_exportado.json'
+        archivo.write_text(json.dumps(registros), encoding = 'utf-8')
+        return str(tmp_path), str(archivo)
+    return crear
+
+
+@pytest.fixture
+def malla_hogares():
+    # Reglas del hogar (zona, actividades con tipo y monto), de los integrantes (sexo, embarazo) y de integrantes que dependen del hogar (ocupacion)
+    return {
+        'id': regla(opcional = True),
+        'NUMERODOCUMENTOTITULAR': regla(opcional = True),
+        'num_documento': regla(opcional = True),
+        'zona': regla({'valor': [1, 2], 'Tipo': 'int'}),
+        'actividades': regla(opcional = True),
+        'tipo': regla({'valor': ['1', '2'], 'Tipo': 'list'}),
+        'monto': regla(opcional = True),
+        'sexo': regla({'valor': ['1', '2'], 'Tipo': 'str'}),
+        'embarazo': regla({'valor': [1, 2], 'Tipo': 'int'}, condicion = {'sexo': ['2']}),
+        'ocupacion': regla({'valor': ['A', 'B'], 'Tipo': 'str'}, condicion = 'zona == 1 and Edad >= 18'),
+        'Edad': regla(opcional = True),
+        }
+
+
+@pytest.fixture
+def registros_hogares():
+    def integrante(documento, sexo, edad, embarazo = None, ocupacion = None):
+        return {'num_documento': documento, 'sexo': sexo, 'Edad': edad, 'embarazo': embarazo, 'ocupacion': ocupacion}
+    return [
+        {'id': 0, 'respuestas': {'NUMERODOCUMENTOTITULAR': '10', 'zona': 1, 'actividades': [{'tipo': '1', 'monto': 1}],
+                                 'integrante': [integrante('10', '1', 40, ocupacion = 'A'), integrante('11', '2', 12, embarazo = 2)]}},
+        {'id': 1, 'respuestas': {'NUMERODOCUMENTOTITULAR': '20', 'zona': 2, 'actividades': [{'tipo': '3', 'monto': 1}],
+                                 'integrante': [integrante('20', '2', 30, embarazo = 1)]}},
+        {'id': 2, 'respuestas': {'NUMERODOCUMENTOTITULAR': '30', 'zona': 1, 'actividades': [{'tipo': '2', 'monto': 1}],
+                                 'integrante': [integrante('30', '1', 50), integrante('31', '2', 20, embarazo = 7, ocupacion = 'B'),
+                                                integrante('32', '3', 5)]}},
+        {'id': 3, 'respuestas': {'NUMERODOCUMENTOTITULAR': '40', 'zona': 5, 'actividades': [{'tipo': '1', 'monto': 1}],
+                                 'integrante': [integrante('40', '1', 33), integrante('10', '1', 70)]}},
+        {'id': 4, 'respuestas': {'NUMERODOCUMENTOTITULAR': '50', 'actividades': [{'tipo': '2', 'monto': 1}],
+                                 'integrante': [integrante('50', '2', 25, embarazo = 1), integrante('51', None, 30)]}},
+        ]
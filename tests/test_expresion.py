@@ -0,0 +1,193 @@
+import numpy as np
+import pandas as pd
+import pytest
+import validationgrid.expresion as expresion
+from validationgrid.expresion import (compilar_expresion, columnas_expresion, evaluar_expresion, traducir_condicion,
+                                      unir_condiciones)
+
+
+@pytest.fixture
+def data():
+    return pd.DataFrame({
+        'a': [1, 2, 3, np.nan, 5],
+        'b': [5, 4, 3, 2, 1],
+        'c': [1, 0, 1, 0, 1],
+        'texto': ['SI', 'NO', None, 'SI', 'AB12'],
+        'Edad': [10, 25, 40, np.nan, 70],
+        'nombre con espacio': [1, 1, 2, 2, 3],
+        })
+
+
+@pytest.fixture(params = ['numexpr', 'numpy'])
+def motor(request, monkeypatch):
+    # Las partes numéricas se evalúan con numexpr si está instalado y con numpy en otro caso, se prueban los dos caminos
+    if request.param == 'numexpr':
+        if expresion.numexpr is None:
+            pytest.skip('numexpr no está instalado')
+        llamadas = []
+        evaluar = expresion.numexpr.evaluate
+        def espia(*args, **kwargs):
+            llamadas.append(args[0])
+            return evaluar(*args, **kwargs)
+        monkeypatch.setattr(expresion.numexpr, 'evaluate', espia)
+        return llamadas
+    monkeypatch.setattr(expresion, 'numexpr', None)
+    return None
+
+
+def evaluar(texto, data, valor = None):
+    return list(evaluar_expresion(texto, data, valor = valor))
+
+
+# Precedencia y sintaxis
+
+def test_and_antes_que_or(data):
+    assert evaluar('a == 1 or b == 3 and c == 1', data) == [True, False, True, False, False]
+    assert evaluar('(a == 1 or b == 3) and c == 0', data) == [False, False, False, False, False]
+
+
+def test_not_antes_que_and(data):
+    assert evaluar('not c == 1 and b > 2', data) == [False, True, False, False, False]
+
+
+def test_producto_antes_que_suma(data, motor):
+    assert evaluar('1 + 2 * b == 7', data) == [False, False, True, False, False]
+    assert evaluar('(1 + 2) * c == 3', data) == [True, False, True, False, True]
+    assert evaluar('-a < -2', data) == [False, False, True, False, True]
+
+
+def test_alias_en_espanol(data):
+    assert evaluar('c = 1 y no b <> 3', data) == evaluar('c == 1 and not b != 3', data)
+    assert evaluar('a en [1, 2] o b entre 1 y 2', data) == evaluar('a in [1, 2] or b between 1 and 2', data)
+
+
+def test_nombre_entre_comillas_invertidas(data):
+    assert evaluar('`nombre con espacio` == 2', data) == [False, False, True, True, False]
+    assert columnas_expresion('`nombre con espacio` == 2 and a > b') == ['nombre con espacio', 'a', 'b']
+
+
+def test_expresion_compilada_una_vez():
+    assert compilar_expresion('a > 1') is compilar_expresion('a > 1')
+
+
+@pytest.mark.parametrize('texto', ['a >', 'a in 1', '(a > 1', 'a > 1 b', 'f(a)', "match(a)"])
+def test_errores_de_sintaxis(texto):
+    with pytest.raises(ValueError):
+        compilar_expresion(texto)
+
+
+# Comparaciones y valores vacíos
+
+def test_comparacion_con_vacio_es_falsa(data, motor):
+    assert evaluar('a > 0', data) == [True, True, True, False, True]
+    assert evaluar('not a > 0', data) == [False, False, False, True, False]
+    assert evaluar('a != 1', data) == [False, True, True, True, True]
+
+
+def test_between(data, motor):
+    assert evaluar('a between 2 and 3', data) == [False, True, True, False, False]
+    assert evaluar('Edad between 18 and 60', data) == [False, True, True, False, False]
+
+
+def test_comparacion_entre_columnas(data, motor):
+    assert evaluar('a >= b', data) == [False, False, True, False, True]
+    assert evaluar('a + b == 6', data) == [True, True, True, False, True]
+
+
+def test_in_y_not_in(data):
+    assert evaluar("texto in ['SI', 'AB12']", data) == [True, False, False, True, True]
+    assert evaluar("texto not in ['SI', 'AB12']", data) == [False, True, True, False, False]
+    assert evaluar('a in [1, 5]', data) == [True, False, False, False, True]
+    assert evaluar('a not in [1, 5]', data) == [False, True, True, True, False]
+
+
+def test_texto_comparado_con_numero_es_falso(data):
+    assert evaluar('texto > 1', data) == [False] * 5
+
+
+# Funciones
+
+def test_funciones(data):
+    assert evaluar('isnull(texto)', data) == [False, False, True, False, False]
+    assert evaluar('notnull(a)', data) == [True, True, True, False, True]
+    assert evaluar("match(texto, '[A-Z]{2}[0-9]+')", data) == [False, False, False, False, True]
+    assert evaluar("nulo(a) o coincide(texto, 'N')", data) == [False, True, False, True, False]
+    assert evaluar('no_nulo(texto)', data) == evaluar('notnull(texto)', data)
+
+
+def test_match_no_necesita_duplicar_barras(data):
+    assert evaluar(r"match(texto, '\w{2}\d+')", data) == [False, False, False, False, True]
+
+
+# Variable valor
+
+def test_valor_es_la_columna_validada(data, motor):
+    assert evaluar('valor <= b and notnull(valor)', data, valor = data['a']) == [True, True, True, False, False]
+
+
+def test_valor_fuera_de_los_valores_de_la_malla(data):
+    with pytest.raises(ValueError):
+        evaluar('valor > 1', data)
+
+
+def test_columna_inexistente(data):
+    with pytest.raises(ValueError):
+        evaluar('d > 1', data)
+
+
+# Columnas categóricas
+
+def test_columna_categorica(data):
+    data['categoria'] = pd.Categorical(['SI', None, 'NO', 'SI', None])
+    data['booleana'] = pd.Categorical([True, None, False, True, None])
+    assert evaluar("categoria == 'SI'", data) == [True, False, False, True, False]
+    assert evaluar("categoria in ['NO']", data) == [False, False, True, False, False]
+    assert evaluar('booleana', data) == [True, False, False, True, False]
+    assert evaluar('not booleana', data) == [False, True, True, False, True]
+
+
+# Motores de evaluación
+
+def test_numexpr_y_numpy_dan_el_mismo_resultado(data, motor):
+    texto = '(a * 2 > b or a + 1 between 3 and 4) and not Edad < 18'
+    assert evaluar(texto, data) == [False, True, True, False, True]
+    if motor is not None:
+        assert motor, 'la parte numérica de la expresión no se evaluó con numexpr'
+
+
+# Condiciones en formato de diccionario
+
+def condicion_anterior(diccionario, data, iand):
+    # Resultado de las condiciones en diccionario antes del lenguaje de expresiones: isin por variable y > para Edad
+    total = None
+    for col, valores in diccionario.items():
+        parte = data[col] > valores[0] if 'Edad' in col else data[col].isin(valores)
+        total = parte if total is None else (total & parte if iand else total | parte)
+    return list(total)
+
+
+@pytest.mark.parametrize('diccionario', [
+    {'c': [1]},
+    {'texto': ['SI', 'NO']},
+    {'Edad': [18]},
+    {'a': [1, 2], 'texto': ['SI']},
+    {'Edad': [30], 'c': [1], 'texto': ['SI', 'AB12']},
+    {'a': [1, np.nan]},
+    {'a': [np.nan]},
+    {'Edad': [np.nan]},
+    {'a': []},
+    ])
+@pytest.mark.parametrize('iand', [True, False])
+def test_paridad_con_condiciones_en_diccionario(data, diccionario, iand):
+    assert evaluar(traducir_condicion(diccionario, iand), data) == condicion_anterior(diccionario, data, iand)
+
+
+def test_literales_de_la_traduccion(data):
+    assert traducir_condicion({"o'brien": ["l'a", True, 2.5]}) == "`o'brien` in ['l\\'a', true, 2.5]"
+    assert evaluar(traducir_condicion({'texto': ["S'I"]}), data) == [False] * 5
+
+
+def test_unir_condiciones():
+    assert unir_condiciones({'a': [1]}, {'b': [2]}) == {'a': [1], 'b': [2]}
+    assert unir_condiciones(None, 'a > 1') == 'a > 1'
+    assert unir_condiciones({'a': [1]}, 'b > 1', iand = True) == '(`a` in [1]) and (b > 1)'
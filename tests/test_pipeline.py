@@ -0,0 +1,58 @@
+import time
+import pytest
+import validationgrid.pipeline as pipeline
+from validationgrid.pipeline import PipelineValidacion
+from validationgrid.read import agrupar_en_lotes, esquema_expansion_lotes
+from validar_datos import validar_datos
+
+
+@pytest.fixture
+def validacion(malla_anidada, registros_anidados):
+    esquema = esquema_expansion_lotes(agrupar_en_lotes(registros_anidados, tamano_lote = 1), malla_anidada)
+    return PipelineValidacion(malla_anidada, esquema, tamano_cola = 2, trabajadores = 3)
+
+
+def lotes(registros):
+    return list(agrupar_en_lotes(registros, tamano_lote = 1))
+
+
+def test_resultados_en_el_orden_de_validar_datos(validacion, proyecto, malla_anidada, registros_anidados, monkeypatch):
+    # El primer lote se demora, así los demás terminan antes y la unión tiene que reordenarlos
+    aplanar = pipeline.aplanar_lote
+    def aplanar_lento(registros):
+        if registros[0]['id'] == 0:
+            time.sleep(0.3)
+        return aplanar(registros)
+    monkeypatch.setattr(pipeline, 'aplanar_lote', aplanar_lento)
+
+    validos, novalidos = validacion.ejecutar(lotes(registros_anidados))
+    ruta, archivo = proyecto(malla_anidada, registros_anidados)
+    _, validos_completo, novalidos_completo = validar_datos('prueba', None, ruta, ruta_archivo = archivo)
+    assert validos.reset_index(drop = True).equals(validos_completo.reset_index(drop = True))
+    assert novalidos.reset_index(drop = True).equals(novalidos_completo.reset_index(drop = True))
+    assert sorted(novalidos['ID_HOGAR'].unique()) == [1, 2, 4, 5]
+
+
+def test_error_de_una_etapa(validacion, registros_anidados, monkeypatch):
+    validar = pipeline.validar_lote
+    def validar_con_error(dataframe, malla):
+        if (dataframe['id'] == 3).any():
+            raise RuntimeError('fallo en el lote 3')
+        return validar(dataframe, malla)
+    monkeypatch.setattr(pipeline, 'validar_lote', validar_con_error)
+
+    with pytest.raises(RuntimeError, match = 'fallo en el lote 3'):
+        validacion.ejecutar(lotes(registros_anidados))
+
+    # La misma instancia se puede volver a ejecutar después del error
+    monkeypatch.setattr(pipeline, 'validar_lote', validar)
+    validos, novalidos = validacion.ejecutar(lotes(registros_anidados))
+    assert sorted(novalidos['ID_HOGAR'].unique()) == [1, 2, 4, 5]
+
+
+def test_colas_vacias_al_terminar(validacion, registros_anidados):
+    for _ in range(2):
+        validacion.ejecutar(lotes(registros_anidados))
+        estadisticas = validacion.estadisticas()
+        assert all(etapa['cola'] == 0 for etapa in estadisticas.values())
+        assert all(etapa['lotes'] == len(registros_anidados) for etapa in estadisticas.values())
@@ -0,0 +1,71 @@
+import io
+import json
+import pytest
+import requests
+import validationgrid.read as read
+from validationgrid.read import _decodificar_registros, muestrear_registros, solicitar_resultados
+
+
+def ids(texto, tamano_bloque = 5):
+    return [registro['id'] for registro in _decodificar_registros(io.BytesIO(texto.encode('utf-8')), tamano_bloque = tamano_bloque)]
+
+
+@pytest.mark.parametrize('texto', [
+    '[{"id": 1}, {"id": 2}, {"id": 3}]',
+    '﻿[{"id": 1},\n {"id": 2},\n {"id": 3}]\n',
+    '{"id": 1}\n{"id": 2}\n{"id": 3}\n',
+    ])
+def test_arreglo_y_ndjson(texto):
+    assert ids(texto) == [1, 2, 3]
+
+
+def test_respuestas_concatenadas():
+    # Un archivo NDJSON en el que la primera línea es una respuesta completa del API
+    assert ids('[{"id": 1}, {"id": 2}]\n[{"id": 3}]\n[]\n{"id": 4}\n') == [1, 2, 3, 4]
+
+
+def test_contenido_despues_del_arreglo():
+    with pytest.raises(json.JSONDecodeError):
+        ids('[{"id": 1}] resto')
+
+
+@pytest.mark.parametrize('tamano_muestra', [1, 3, 10, 17, 50, 200])
+def test_muestra_estratificada_del_tamano_pedido(tamano_muestra):
+    # Con redondeo por estrato cinco estratos pequeños y uno grande daban más hogares de los pedidos
+    registros = [{'id': i, 'zona': 'A' if i < 80 else 'BCDEF'[i % 5]} for i in range(100)]
+    muestra, tamanos = muestrear_registros(registros, tamano_muestra, estrato = 'zona', semilla = 1)
+    assert len(muestra) == sum(tamanos['muestra'].values()) == min(tamano_muestra, len(registros))
+    assert len({registro['id'] for registro in muestra}) == len(muestra)
+    if tamano_muestra >= len(tamanos['poblacion']):
+        assert min(tamanos['muestra'].values()) >= 1
+
+
+@pytest.fixture
+def api_lenta(monkeypatch):
+    # Las primeras `lentas` solicitudes superan el tiempo de espera, las demás responden 200
+    llamadas = []
+    def crear(lentas):
+        def get(url, headers, stream, timeout):
+            llamadas.append(timeout)
+            if len(llamadas) <= lentas:
+                raise requests.exceptions.ReadTimeout('sin respuesta')
+            response = requests.Response()
+            response.status_code = 200
+            return response
+        monkeypatch.setattr(read.requests, 'get', get)
+        monkeypatch.setattr(read.time, 'sleep', lambda segundos: None)
+        return llamadas
+    return crear
+
+
+def test_reintenta_si_el_api_no_responde_a_tiempo(api_lenta):
+    llamadas = api_lenta(lentas = 2)
+    assert solicitar_resultados('1', {}, reintentos = 3).status_code == 200
+    assert llamadas == [read.TIEMPO_ESPERA_API] * 3
+
+
+def test_tiempo_de_espera_despues_de_los_reintentos(api_lenta):
+    llamadas = api_lenta(lentas = 10)
+    with pytest.raises(requests.exceptions.Timeout):
+        solicitar_resultados('1', {}, reintentos = 2, timeout = (1, 2))
+    assert llamadas == [(1, 2)] * 3
@@ -0,0 +1,171 @@
+import tracemalloc
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+import validationgrid.valgrid as valgrid
+from validationgrid.valgrid import (marcar_documentos_previos, categorizar_valores, columna_categorica, codigos_permitidos,
+                                    verificar_valores, malla_validacion, malla_validacion_multiple, diferencias_entre_mallas,
+                                    resultados_malla_de_validacion, filas_por_bloque, FILAS_MINIMAS_BLOQUE)
+
+
+def regla(valores = None, tipo = None, condicion = None, opcional = False):
+    return {'condicion': condicion, 'valores': None if valores is None else {'valor': valores, 'Tipo': tipo}, 'iand': False,
+            'opcional': opcional, 'excluida_PTA': False}
+
+
+@pytest.fixture
+def malla_cerrada():
+    return {
+        'id': regla(opcional = True),
+        'NUMERODOCUMENTOTITULAR': regla(opcional = True),
+        'num_documento': regla(opcional = True),
+        'sexo': regla(['1', '2'], 'str'),
+        'zona': regla([1, 2, 3], 'int'),
+        'embarazo': regla([1, 2], 'int', condicion = {'sexo': ['2']}),
+        'ocupacion': regla(['A', 'B'], 'str', condicion = 'zona in [1, 2] and sexo == \'1\''),
+        'Edad': regla(opcional = True),
+        }
+
+
+@pytest.fixture
+def datos_cerrados():
+    # Valores permitidos, fuera de dominio ('3', 9, 'Z'), vacíos y enteros escritos como texto o decimal
+    return pd.DataFrame({
+        'id': [1, 1, 2, 3, 3, 4, 5],
+        'NUMERODOCUMENTOTITULAR': ['10', '10', '20', '30', '30', '40', '50'],
+        'num_documento': ['10', '11', '20', '30', '31', '40', '50'],
+        'sexo': ['1', '2', '3', None, '2', '1', np.nan],
+        'zona': [1, 2.0, 9, np.nan, '3', 2, 1],
+        'embarazo': [None, 1, 2, 5, np.nan, 1, 3],
+        'ocupacion': ['A', 'Z', None, 'B', 'A', np.nan, 'B'],
+        'Edad': [30, 25, 40, 18, 50, 60, 70],
+        })
+
+
+@pytest.mark.parametrize('tamano_lote', [1, 2, 3, 4])
+def test_documentos_previos_igual_a_duplicated(tamano_lote):
+    # Los documentos vacíos se repiten solo con vacíos del mismo tipo, igual que duplicated() en la validación completa
+    documentos = pd.Series(['100', None, '100', None, '101', np.nan, '200', np.nan, None, '101', pd.NA, pd.NA], dtype = object)
+    documentos_previos = set()
+    marcados = []
+    for inicio in range(0, len(documentos), tamano_lote):
+        lote = documentos.iloc[inicio:inicio + tamano_lote].reset_index(drop = True)
+        duplicado = lote.duplicated().to_numpy().astype(np.int8)
+        validado = pd.DataFrame({'NUM_DOC_INTEGRANTE': lote, 'Documento_Duplicado': duplicado, 'Validacion': duplicado.astype(np.int64)})
+        validado = marcar_documentos_previos(validado, documentos_previos)
+        assert (validado['Validacion'] == validado['Documento_Duplicado']).all()
+        marcados.extend(validado['Documento_Duplicado'])
+    assert marcados == documentos.duplicated().astype(int).tolist()
+
+
+# Columnas categóricas
+
+def test_categoricas_y_objeto_dan_los_mismos_errores(datos_cerrados, malla_cerrada):
+    categoricas = categorizar_valores(datos_cerrados, malla_cerrada)
+    assert [col for col in categoricas if isinstance(categoricas[col].dtype, pd.CategoricalDtype)] == ['sexo', 'zona', 'embarazo', 'ocupacion']
+    errores_objeto, obligatorias_objeto = malla_validacion(datos_cerrados, malla_cerrada)
+    errores_categoricas, obligatorias_categoricas = malla_validacion(categoricas, malla_cerrada)
+    pd.testing.assert_frame_equal(errores_objeto, errores_categoricas)
+    assert obligatorias_objeto == obligatorias_categoricas
+    assert errores_objeto['sexo'].tolist() == [0, 0, 1, 1, 0, 0, 1]
+    assert errores_objeto['zona'].tolist() == [0, 0, 1, 1, 0, 0, 0]
+
+
+def test_categorizar_no_modifica_los_datos(datos_cerrados, malla_cerrada):
+    tipos = datos_cerrados.dtypes.copy()
+    categorizar_valores(datos_cerrados, malla_cerrada)
+    assert datos_cerrados.dtypes.equals(tipos)
+
+
+def test_columna_categorica(datos_cerrados, malla_cerrada):
+    sexo = columna_categorica('sexo', datos_cerrados['sexo'], malla_cerrada)
+    assert sexo.cat.categories.tolist() == ['1', '2', '3']
+    assert sexo.isna().tolist() == datos_cerrados['sexo'].isna().tolist()
+    zona = columna_categorica('zona', datos_cerrados['zona'], malla_cerrada)
+    assert zona.cat.categories.tolist() == [1, 2, 3, 9]
+    # Las columnas de identificación, de edad, fuera de la malla o ya categóricas no se convierten
+    for col in ['num_documento', 'Edad']:
+        assert columna_categorica(col, datos_cerrados[col], malla_cerrada) is None
+    assert columna_categorica('otra', datos_cerrados['sexo'], malla_cerrada) is None
+    assert columna_categorica('sexo', sexo, malla_cerrada) is None
+
+
+@pytest.mark.parametrize('col', ['sexo', 'zona', 'ocupacion'])
+def test_codigos_permitidos_igual_a_isin(datos_cerrados, malla_cerrada, col):
+    valores = malla_cerrada[col]['valores']
+    categorica = columna_categorica(col, datos_cerrados[col], malla_cerrada)
+    esperado = categorica.astype(object).isin(valores['valor'])
+    assert codigos_permitidos(categorica, valores['valor']).equals(esperado)
+    assert verificar_valores(valores, pd.DataFrame({col: categorica}), col).equals(esperado)
+    # Con las categorías en otro orden no aplica la comparación de códigos y se usa isin
+    desordenada = categorica.cat.reorder_categories(categorica.cat.categories[::-1])
+    assert codigos_permitidos(desordenada, valores['valor']).equals(esperado)
+
+
+# Varias mallas
+
+def test_malla_validacion_multiple_igual_a_cada_malla(datos_cerrados, malla_cerrada):
+    # La segunda malla cambia los valores de zona, las demás reglas son las mismas y se evalúan una sola vez
+    mallas = {'v1': malla_cerrada, 'v2': dict(malla_cerrada, zona = regla([1, 2, 3, 9], 'int'))}
+    resultados, conteo = malla_validacion_multiple(datos_cerrados, mallas)
+    for nombre, malla in mallas.items():
+        errores, obligatorias = malla_validacion(categorizar_valores(datos_cerrados, malla), malla)
+        pd.testing.assert_frame_equal(resultados[nombre][0], errores)
+        assert resultados[nombre][1] == obligatorias
+    assert resultados['v1'][0]['zona'].tolist() != resultados['v2'][0]['zona'].tolist()
+    assert conteo['reglas_evaluadas'] < conteo['reglas']
+
+
+def test_diferencias_entre_mallas():
+    def estado(documentos, errores):
+        return pd.DataFrame({'ID_HOGAR': 1, 'NUM_TITULAR': '10', 'NUM_DOC_INTEGRANTE': documentos, 'Errores': errores})
+    resultados = {
+        'v1': (estado(['10'], ['']), estado(['11', '12'], ['sexo', 'zona'])),
+        'v2': (estado(['10', '12'], ['', '']), estado(['11'], ['sexo'])),
+        }
+    diferencias = diferencias_entre_mallas(resultados)
+    assert diferencias['NUM_DOC_INTEGRANTE'].tolist() == ['12']
+    assert diferencias[['Valido_v1', 'Valido_v2', 'Errores_v1']].iloc[0].tolist() == [False, True, 'zona']
+
+
+# Presupuesto de memoria
+
+@pytest.fixture
+def datos_grandes(datos_cerrados, malla_cerrada):
+    # datos_cerrados repetidos en 1000 grupos de hogares, cada documento se repite en dos integrantes seguidos
+    repeticiones = 1000
+    datos = pd.concat([datos_cerrados] * repeticiones, ignore_index = True)
+    datos['id'] += np.repeat(np.arange(repeticiones) * 10, len(datos_cerrados))
+    datos['num_documento'] = (datos.index // 2).astype(str)
+    return categorizar_valores(datos, malla_cerrada)
+
+
+@pytest.mark.parametrize('memory_budget, lenta', [(400_000, True), (1_000_000, False)])
+def test_presupuesto_de_memoria_igual_a_validacion_completa(datos_grandes, malla_cerrada, memory_budget, lenta, monkeypatch):
+    validos, novalidos = resultados_malla_de_validacion(datos_grandes, malla_cerrada)
+    with pytest.warns(UserWarning, match = 'la validación será lenta') if lenta else warnings.catch_warnings():
+        validos_bloques, novalidos_bloques = resultados_malla_de_validacion(datos_grandes, malla_cerrada, memory_budget = memory_budget)
+    assert len(validos) > 0 and len(novalidos) > 0
+    assert validos_bloques.equals(validos) and novalidos_bloques.equals(novalidos)
+
+    # Se guarda el tamaño de cada bloque que se valida y la memoria máxima de la validación
+    bloques = []
+    validar = valgrid.validar_columnas
+    def validar_bloque(vista, *args, **kwargs):
+        bloques.append(len(vista))
+        return validar(vista, *args, **kwargs)
+    monkeypatch.setattr(valgrid, 'validar_columnas', validar_bloque)
+    tracemalloc.start()
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            malla_validacion(datos_grandes, malla_cerrada, memory_budget = memory_budget)
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    filas = filas_por_bloque(datos_grandes, malla_cerrada, list(malla_cerrada), memory_budget)
+    assert (filas < FILAS_MINIMAS_BLOQUE) == lenta
+    assert len(bloques) > 1 and set(bloques[:-1]) == {filas} and sum(bloques) == len(datos_grandes)
+    assert pico <= memory_budget
@@ -0,0 +1,88 @@
+import pytest
+from validar_datos import validar_datos, validar_archivo_por_lotes, validar_datos_normalizado, validar_datos_mallas
+
+
+def hogares(novalidos):
+    return sorted(novalidos['ID_HOGAR'].unique())
+
+
+@pytest.mark.parametrize('tamano_lote', [1, 2, 4, 10])
+def test_lotes_igual_a_validacion_completa(proyecto, malla_anidada, registros_anidados, tamano_lote):
+    ruta, archivo = proyecto(malla_anidada, registros_anidados)
+    _, validos, novalidos = validar_datos('prueba', None, ruta, ruta_archivo = archivo)
+    validos_lotes, novalidos_lotes = validar_archivo_por_lotes('prueba', ruta, archivo, tamano_lote = tamano_lote)
+    assert hogares(novalidos) == [1, 2, 4, 5]
+    assert hogares(novalidos_lotes) == hogares(novalidos)
+    assert hogares(validos_lotes) == hogares(validos)
+
+
+def test_documentos_duplicados_entre_lotes(proyecto, malla_anidada):
+    documentos = [['100', '102'], ['100', '101'], ['200'], ['101', '300', '100']]
+    registros = [{'id': id_hogar, 'respuestas': {'NUMERODOCUMENTOTITULAR': hogar[0], 'actividades': [{'tipo': '1'}],
+                                                 'integrante': [{'num_documento': documento} for documento in hogar]}}
+                 for id_hogar, hogar in enumerate(documentos)]
+    ruta, archivo = proyecto(malla_anidada, registros)
+
+    _, validos, novalidos = validar_datos('prueba', None, ruta, ruta_archivo = archivo)
+    assert list(novalidos['Errores']) == ['Documento_Duplicado'] * 3
+    for tamano_lote in [1, 2, 3]:
+        validos_lotes, novalidos_lotes = validar_archivo_por_lotes('prueba', ruta, archivo, tamano_lote = tamano_lote)
+        assert validos_lotes.reset_index(drop = True).equals(validos.reset_index(drop = True))
+        assert novalidos_lotes.reset_index(drop = True).equals(novalidos.reset_index(drop = True))
+
+
+def test_validar_datos_conserva_los_tipos(proyecto, malla_anidada, registros_anidados):
+    # Las columnas de valores cerrados se validan como categóricas, pero el dataframe resultante conserva sus tipos
+    malla = dict(malla_anidada, sexo = {'condicion': None, 'valores': {'valor': ['1', '2'], 'Tipo': 'str'}, 'iand': False,
+                                        'opcional': False, 'excluida_PTA': False})
+    for i, registro in enumerate(registros_anidados):
+        registro['respuestas']['sexo'] = ['1', '2', '3'][i % 3]
+    ruta, archivo = proyecto(malla, registros_anidados)
+    dataframe, _, novalidos = validar_datos('prueba', None, ruta, ruta_archivo = archivo)
+    assert dataframe['sexo'].dtype == object
+    assert sorted(novalidos['ID_HOGAR'].unique()) == [1, 2, 4, 5]
+
+
+@pytest.mark.parametrize('fail_fast', [False, True])
+def test_normalizado_igual_a_validar_datos(proyecto, malla_hogares, registros_hogares, fail_fast):
+    ruta, archivo = proyecto(malla_hogares, registros_hogares)
+    _, validos, novalidos = validar_datos('prueba', None, ruta, ruta_archivo = archivo, fail_fast = fail_fast)
+    tabla_hogares, integrantes, validos_normalizado, novalidos_normalizado = validar_datos_normalizado('prueba', None, ruta, ruta_archivo = archivo, fail_fast = fail_fast)
+    assert len(tabla_hogares) == len(registros_hogares) and len(integrantes) == 10
+    assert hogares(novalidos) == [1, 2, 3, 4]
+    assert validos_normalizado.reset_index(drop = True).equals(validos.reset_index(drop = True))
+    if fail_fast:
+        # En modo fail_fast los errores dependen del orden en que se revisan las variables, solo se comparan los registros
+        assert novalidos_normalizado['NUM_DOC_INTEGRANTE'].tolist() == novalidos['NUM_DOC_INTEGRANTE'].tolist()
+    else:
+        assert novalidos_normalizado.reset_index(drop = True).equals(novalidos.reset_index(drop = True))
+
+
+@pytest.fixture
+def versiones(malla_hogares):
+    # v2 acepta la zona 5 y cambia la condición de ocupacion, v3 no expande actividades; las demás reglas se repiten entre mallas
+    v2 = dict(malla_hogares, zona = dict(malla_hogares['zona'], valores = {'valor': [1, 2, 5], 'Tipo': 'int'}),
+              ocupacion = dict(malla_hogares['ocupacion'], condicion = 'zona == 1 and Edad >= 60'))
+    v3 = {variable: regla for variable, regla in malla_hogares.items() if variable not in ['actividades', 'tipo', 'monto']}
+    return {'v1': malla_hogares, 'v2': v2, 'v3': v3}
+
+
+def test_mallas_igual_a_cada_malla_por_separado(proyecto, versiones, registros_hogares):
+    for id_malla, malla in versiones.items():
+        ruta, archivo = proyecto(malla, registros_hogares, id_encuesta = id_malla)
+    resultados, diferencias = validar_datos_mallas('v1', None, ruta, list(versiones), ruta_archivo = archivo)
+
+    assert list(resultados) == list(versiones)
+    separados = {}
+    for id_malla in versiones:
+        _, validos, novalidos = validar_datos(id_malla, None, ruta, ruta_archivo = archivo)
+        validos_mallas, novalidos_mallas = resultados[id_malla]
+        assert validos_mallas.reset_index(drop = True).equals(validos.reset_index(drop = True))
+        assert novalidos_mallas.reset_index(drop = True).equals(novalidos.reset_index(drop = True))
+        separados[id_malla] = set(novalidos['NUM_DOC_INTEGRANTE'])
+    assert hogares(resultados['v1'][1]) == [1, 2, 3, 4]
+
+    # Los participantes que cambian de estado son los que no están en los no validos de todas las mallas o de ninguna
+    cambian = set.union(*separados.values()) - set.intersection(*separados.values())
+    assert set(diferencias['NUM_DOC_INTEGRANTE']) == cambian == {'20', '30', '40'}
+    assert diferencias.set_index('NUM_DOC_INTEGRANTE').loc['40', ['Valido_v1', 'Valido_v2', 'Valido_v3']].tolist() == [False, True, False]
@@ -1,29 +1,246 @@
-from typing import List, Dict, Tuple, Union
+from typing import List, Dict, Tuple, Union, Optional
 import pandas as pd
-from validationgrid.read import read__dataframe, cargar_malla_validacion, expandir_columnas_adicionales
-from validationgrid.valgrid import resultados_malla_de_validacion
+from validationgrid.read import read__dataframe, read__dataframe_archivo, iter_dataframe_archivo, cargar_malla_validacion, expandir_columnas_adicionales
+from validationgrid.read import iterar_registros_api, iterar_registros_archivo, leer_lotes_archivo, agrupar_en_lotes, muestrear_registros, normalizar_respuestas
+from validationgrid.read import get_response, normalizar_hogares_integrantes, columnas_tipo_lista, columnas_a_expandir, expandir_columnas, esquema_expansion_lotes
+from validationgrid.valgrid import resultados_malla_de_validacion, resultados_malla_de_validacion_por_lotes, categorizar_valores, malla_validacion, tasas_de_error
+from validationgrid.valgrid import resultados_malla_de_validacion_normalizada, malla_validacion_multiple, separar_resultados_mallas
+from validationgrid.pipeline import PipelineValidacion
 
 
-def validar_datos(id_encuesta: str, token:str, ruta: str)-> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+def validar_datos(id_encuesta: str, token: Optional[str], ruta: str, ruta_archivo: Optional[str] = None, fail_fast: bool = False,
+                 url_api: Optional[str] = None, memory_budget: Optional[int] = None)-> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """Función que realiza la validación de los datos de la encuesta seleccionada
 
     Args:
         id_encuesta (str): Id de la encuesta sobre la que se van a revisar los datos
-        token (str): Token de Acceso al API
+        token (Optional[str]): Token de Acceso al API, no se usa si se entrega ruta_archivo
         ruta (str): Ruta al folder donde esta el proyecto
+        ruta_archivo (Optional[str]): Ruta a un archivo exportado del Sincronizador (JSON, NDJSON o .gz). Si se entrega,
+        los datos se leen desde el archivo en lugar del API
+        fail_fast (bool): Si es True, cada registro deja de revisarse en su primer error. Los datos validos y no validos
+        no cambian, pero en Errores solo aparecen las variables revisadas
+        url_api (Optional[str]): Dirección base del API del Sincronizador, por defecto la de read.URL_API
+        memory_budget (Optional[int]): Memoria máxima en bytes para la validación, sin contar los datos. Si se supera, las
+        filas se validan por bloques sin cambiar el resultado
 
     Returns:
         Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: Dataframe resultante, datos validos y datos no validos
     """
-    # Se define el token de Acceso al API
-    headers = {"Authorization": f"Bearer {token}"}
-    
-    # Se carga y modifica el dataframe
-    dataframe = read__dataframe(id_encuesta, headers)
+    # Se carga y modifica el dataframe desde el archivo o desde el API
+    if ruta_archivo is not None:
+        dataframe = read__dataframe_archivo(ruta_archivo)
+    else:
+        # Se define el token de Acceso al API
+        headers = {"Authorization": f"Bearer {token}"}
+        dataframe = read__dataframe(id_encuesta, headers, url_api = url_api)
     malla = cargar_malla_validacion(id_encuesta, ruta_folder=ruta)
     dataframe = expandir_columnas_adicionales(dataframe, malla = malla)
+
+    # Se valida la información, las columnas categóricas solo se usan en la validación y el dataframe resultante conserva sus tipos
+    validos, novalidos= resultados_malla_de_validacion(categorizar_valores(dataframe, malla), malla, fail_fast = fail_fast, memory_budget = memory_budget)
+
+    return dataframe, validos, novalidos
+
+
+def validar_datos_mallas(id_encuesta: str, token: Optional[str], ruta: str, mallas: Union[List[str], Dict[str, Union[str, dict]]], ruta_archivo: Optional[str] = None,
+                         url_api: Optional[str] = None)-> Tuple[Dict[str, Tuple[pd.DataFrame, pd.DataFrame]], pd.DataFrame]:
+    """Función que valida los datos de la encuesta con varias mallas de validación, por ejemplo dos versiones de la misma malla
+
+    Los datos se descargan y aplanan una sola vez, las columnas se expanden una sola vez para las mallas que expanden las
+    mismas columnas y las reglas que se repiten entre mallas se evalúan una sola vez (ver malla_validacion_multiple). Los
+    datos validos y no validos de cada malla son los mismos que los de validar_datos con esa malla.
+
+    Args:
+        id_encuesta (str): Id de la encuesta sobre la que se van a revisar los datos
+        token (Optional[str]): Token de Acceso al API, no se usa si se entrega ruta_archivo
+        ruta (str): Ruta al folder donde esta el proyecto
+        mallas (Union[List[str], Dict[str, Union[str, dict]]]): Ids de las mallas en data/json, o diccionario con el nombre
+        de cada malla y su id o la malla ya cargada (por ejemplo creada con create_malla_dict). El orden es el de las versiones
+        ruta_archivo (Optional[str]): Ruta a un archivo exportado del Sincronizador. Si se entrega, los datos se leen desde el archivo
+        url_api (Optional[str]): Dirección base del API del Sincronizador, por defecto la de read.URL_API
+
+    Returns:
+        Tuple[Dict[str, Tuple[pd.DataFrame, pd.DataFrame]], pd.DataFrame]: Datos validos y no validos de cada malla, y
+        participantes que cambian de estado entre mallas
+    """
+    # Se cargan las mallas, las que se entregan como id se leen de data/json
+    if isinstance(mallas, list):
+        mallas = {id_malla: id_malla for id_malla in mallas}
+    mallas = {nombre: cargar_malla_validacion(malla, ruta_folder=ruta) if isinstance(malla, str) else malla for nombre, malla in mallas.items()}
+    
+    # Se carga el dataframe desde el archivo o desde el API una sola vez
+    if ruta_archivo is not None:
+        dataframe = read__dataframe_archivo(ruta_archivo)
+    else:
+        headers = {"Authorization": f"Bearer {token}"}
+        dataframe = read__dataframe(id_encuesta, headers, url_api = url_api)
     
-    # Se valida la información
-    validos, novalidos= resultados_malla_de_validacion(dataframe, malla)
+    # Se agrupan las mallas que expanden las mismas columnas
+    posible_expandir = columnas_tipo_lista(dataframe)
+    grupos = {}
+    for nombre, malla in mallas.items():
+        grupos.setdefault(tuple(columnas_a_expandir(posible_expandir, malla)), {})[nombre] = malla
     
-    return dataframe, validos, novalidos
\ No newline at end of file
+    # Se valida la información de cada grupo de mallas
+    validados = {}
+    reglas, reglas_evaluadas = 0, 0
+    for expandir, guias in grupos.items():
+        resultado, conteo = malla_validacion_multiple(expandir_columnas(dataframe, list(expandir)), guias)
+        validados.update(resultado)
+        reglas += conteo['reglas']
+        reglas_evaluadas += conteo['reglas_evaluadas']
+    print("Se evaluaron {} reglas distintas de {} reglas en {} mallas".format(reglas_evaluadas, reglas, len(mallas)))
+    
+    return separar_resultados_mallas({nombre: validados[nombre] for nombre in mallas if nombre in validados})
+
+
+def validar_datos_normalizado(id_encuesta: str, token: Optional[str], ruta: str, ruta_archivo: Optional[str] = None, fail_fast: bool = False,
+                              url_api: Optional[str] = None)-> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Función que realiza la validación de los datos de la encuesta manteniendo separadas las tablas de hogares e integrantes
+
+    Las reglas que solo usan respuestas del hogar se evalúan una vez por hogar y no una vez por integrante. Los datos
+    validos y no validos tienen la misma forma que en validar_datos.
+
+    Args:
+        id_encuesta (str): Id de la encuesta sobre la que se van a revisar los datos
+        token (Optional[str]): Token de Acceso al API, no se usa si se entrega ruta_archivo
+        ruta (str): Ruta al folder donde esta el proyecto
+        ruta_archivo (Optional[str]): Ruta a un archivo exportado del Sincronizador. Si se entrega, los datos se leen desde el archivo
+        fail_fast (bool): Si es True, cada hogar o integrante deja de revisarse en su primer error
+        url_api (Optional[str]): Dirección base del API del Sincronizador, por defecto la de read.URL_API
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]: Tabla de hogares, tabla de integrantes, datos validos y datos no validos
+    """
+    # Se cargan los registros desde el archivo o desde el API
+    if ruta_archivo is not None:
+        response = list(iterar_registros_archivo(ruta_archivo))
+    else:
+        headers = {"Authorization": f"Bearer {token}"}
+        response = get_response(id_encuesta, headers, url_api = url_api)
+    malla = cargar_malla_validacion(id_encuesta, ruta_folder=ruta)
+
+    # Se separan y modifican las tablas de hogares e integrantes
+    hogares, integrantes = normalizar_hogares_integrantes(response)
+    hogares = expandir_columnas_adicionales(hogares, malla = malla)
+    integrantes = expandir_columnas_adicionales(integrantes, malla = malla)
+
+    # Se valida la información, las tablas que se entregan conservan sus tipos
+    validos, novalidos = resultados_malla_de_validacion_normalizada(categorizar_valores(hogares, malla), categorizar_valores(integrantes, malla), malla, fail_fast = fail_fast)
+
+    return hogares, integrantes, validos, novalidos
+
+
+def validar_archivo_por_lotes(id_encuesta: str, ruta: str, ruta_archivo: str, tamano_lote: int = 1000)-> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Función que valida un archivo exportado del Sincronizador por lotes de hogares de tamaño fijo
+
+    El archivo se lee por bloques, por lo que la memoria usada depende del tamaño del lote y no del tamaño del archivo.
+    El archivo se recorre dos veces: en la primera se identifican las columnas a expandir y las columnas de su expansión
+    (ver esquema_expansion_lotes) y en la segunda se valida cada lote con esas columnas, de modo que el resultado es el
+    mismo que el de validar_datos con el archivo completo.
+
+    Args:
+        id_encuesta (str): Id de la encuesta sobre la que se van a revisar los datos
+        ruta (str): Ruta al folder donde esta el proyecto
+        ruta_archivo (str): Ruta al archivo exportado (JSON, NDJSON o .gz)
+        tamano_lote (int): Número de hogares por lote
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: Datos validos y datos no validos
+    """
+    malla = cargar_malla_validacion(id_encuesta, ruta_folder=ruta)
+    esquema = esquema_expansion_lotes(leer_lotes_archivo(ruta_archivo, tamano_lote = tamano_lote), malla)
+    lotes = (categorizar_valores(expandir_columnas_adicionales(lote, malla = malla, esquema = esquema), malla) for lote in iter_dataframe_archivo(ruta_archivo, tamano_lote = tamano_lote))
+
+    return resultados_malla_de_validacion_por_lotes(lotes, malla)
+
+
+def validar_datos_pipeline(id_encuesta: str, token: Optional[str], ruta: str, ruta_archivo: Optional[str] = None, tamano_lote: int = 500,
+                           tamano_cola: int = 4, trabajadores: int = 2, usar_procesos: bool = False, url_api: Optional[str] = None)-> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, dict]]:
+    """Función que valida la encuesta con las etapas de descarga, aplanado, expansión y validación corriendo en paralelo por lotes
+
+    Mientras se descarga un lote los anteriores se aplanan, expanden y validan. Antes, los registros se recorren una vez
+    para identificar las columnas a expandir y las columnas de su expansión (ver esquema_expansion_lotes), de modo que el
+    resultado es el mismo que el de validar_datos. Con el API esto significa que los resultados se descargan dos veces.
+
+    Args:
+        id_encuesta (str): Id de la encuesta sobre la que se van a revisar los datos
+        token (Optional[str]): Token de Acceso al API, no se usa si se entrega ruta_archivo
+        ruta (str): Ruta al folder donde esta el proyecto
+        ruta_archivo (Optional[str]): Ruta a un archivo exportado del Sincronizador. Si se entrega, los datos se leen desde el archivo
+        tamano_lote (int): Número de hogares por lote
+        tamano_cola (int): Número máximo de lotes en espera entre dos etapas
+        trabajadores (int): Número de trabajadores por etapa de cálculo
+        usar_procesos (bool): Si es True, las etapas de cálculo se ejecutan en un pool de procesos
+        url_api (Optional[str]): Dirección base del API del Sincronizador, por defecto la de read.URL_API
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame, Dict[str, dict]]: Datos validos, datos no validos y estadísticas por etapa
+    """
+    malla = cargar_malla_validacion(id_encuesta, ruta_folder=ruta)
+
+    # Se define la fuente de los lotes, el archivo exportado o el API, que se recorre una vez para el esquema de expansión y otra para validar
+    if ruta_archivo is not None:
+        esquema = esquema_expansion_lotes(leer_lotes_archivo(ruta_archivo, tamano_lote = tamano_lote), malla)
+        lotes = leer_lotes_archivo(ruta_archivo, tamano_lote = tamano_lote)
+    else:
+        headers = {"Authorization": f"Bearer {token}"}
+        esquema = esquema_expansion_lotes(agrupar_en_lotes(iterar_registros_api(id_encuesta, headers, url_api = url_api), tamano_lote = tamano_lote), malla)
+        lotes = agrupar_en_lotes(iterar_registros_api(id_encuesta, headers, url_api = url_api), tamano_lote = tamano_lote)
+
+    pipeline = PipelineValidacion(malla, esquema, tamano_cola = tamano_cola, trabajadores = trabajadores, usar_procesos = usar_procesos)
+    validos, novalidos = pipeline.ejecutar(lotes)
+
+    return validos, novalidos, pipeline.estadisticas()
+
+
+def validar_datos_triage(id_encuesta: str, token: Optional[str], ruta: str, ruta_archivo: Optional[str] = None, tamano_muestra: int = 200,
+                         estrato: Optional[str] = None, nivel_confianza: float = 0.95, fail_fast: bool = False, semilla: Optional[int] = None,
+                         url_api: Optional[str] = None)-> pd.DataFrame:
+    """Función que da una respuesta rápida sobre el estado de la encuesta validando solo una muestra estratificada de hogares
+
+    Los registros se recorren una sola vez para tomar la muestra, y solo la muestra se aplana, expande y valida, por lo que
+    el tiempo de validación no depende del tamaño de la encuesta.
+
+    Args:
+        id_encuesta (str): Id de la encuesta sobre la que se van a revisar los datos
+        token (Optional[str]): Token de Acceso al API, no se usa si se entrega ruta_archivo
+        ruta (str): Ruta al folder donde esta el proyecto
+        ruta_archivo (Optional[str]): Ruta a un archivo exportado del Sincronizador. Si se entrega, los datos se leen desde el archivo
+        tamano_muestra (int): Número de hogares a validar
+        estrato (Optional[str]): Variable del hogar para estratificar la muestra (por ejemplo CODMUNICIPIOATENCION)
+        nivel_confianza (float): Nivel de confianza de los intervalos
+        fail_fast (bool): Si es True, cada registro deja de revisarse en su primer error. La tasa de hogares con errores no
+        cambia, pero las tasas por variable pasan a ser cotas inferiores
+        semilla (Optional[int]): Semilla para repetir la misma muestra
+        url_api (Optional[str]): Dirección base del API del Sincronizador, por defecto la de read.URL_API
+
+    Returns:
+        pd.DataFrame: Tasa de error estimada e intervalo de confianza por variable, incluida la fila Hogar_Con_Errores
+    """
+    malla = cargar_malla_validacion(id_encuesta, ruta_folder=ruta)
+
+    # Se define la fuente de los registros, el archivo exportado o el API
+    if ruta_archivo is not None:
+        registros = iterar_registros_archivo(ruta_archivo)
+    else:
+        headers = {"Authorization": f"Bearer {token}"}
+        registros = iterar_registros_api(id_encuesta, headers, url_api = url_api)
+    muestra, tamanos = muestrear_registros(registros, tamano_muestra, estrato = estrato, semilla = semilla)
+
+    # Se valida únicamente la muestra
+    dataframe = normalizar_respuestas(muestra)
+    dataframe = expandir_columnas_adicionales(dataframe, malla = malla)
+    dataframe = categorizar_valores(dataframe, malla)
+    dataframe_validado, cols_obligatorias = malla_validacion(dataframe, malla, fail_fast = fail_fast)
+
+    estrato_hogar = pd.Series(tamanos['estratos'], index = [registro.get('id') for registro in muestra])
+    resumen = tasas_de_error(dataframe_validado, cols_obligatorias, estrato_hogar, tamanos, nivel_confianza = nivel_confianza)
+
+    print("TRIAGE MALLA DE VALIDACIÓN")
+    print("Se validaron {} de {} hogares".format(len(muestra), sum(tamanos['poblacion'].values())))
+    hogares = resumen[resumen['Variable'] == 'Hogar_Con_Errores'].iloc[0]
+    print("Hogares con errores: {:.1%} (IC {:.0%}: {:.1%} - {:.1%})".format(hogares['Tasa_Error'], nivel_confianza, hogares['Limite_Inferior'], hogares['Limite_Superior']))
+
+    return resumen
@@ -0,0 +1,611 @@
+"""Lenguaje de expresiones de la malla de validación
+
+Las celdas `condicion` y `valores` de la malla pueden contener una expresión en lugar de una lista de valores, por ejemplo:
+
+    ZONA in [2, 3] and (Edad between 18 and 60 or `tip_empleado_otra_actividad` == 'Patrón o empleador')
+    valor <= num_cuartos_vivienda and not isnull(valor)
+
+- Variables: nombres como `ZONA` o `DIFICULTADACTIVIDAD.ind_discap_ver.Seleccionar`, o entre comillas invertidas si el
+nombre tiene espacios u otros caracteres. En la celda de valores, `valor` es la variable que se está validando.
+- Literales: números, textos entre comillas simples o dobles, true / false y listas [1, 2, 3].
+- Comparaciones: ==, =, !=, <>, <, <=, >, >=, in, not in, between ... and ...
+- Operaciones: +, -, *, / sobre valores numéricos.
+- Lógicas: and, or, not (también y, o, no), con paréntesis para agruparlas.
+- Funciones: isnull(x), notnull(x) y match(x, 'expresion regular').
+
+Las comparaciones de orden, between y las operaciones convierten los valores a número, y una comparación con un valor
+vacío o no numérico es falsa (not, != y not in la niegan). La expresión se analiza una vez y se guarda su árbol, que se
+evalúa sobre columnas completas. Las partes de la expresión que solo comparan valores numéricos se evalúan juntas en un
+solo recorrido con numexpr si está instalado.
+"""
+
+import re
+from functools import lru_cache
+from typing import List, Optional, Dict, Union
+import numpy as np
+import pandas as pd
+
+# numexpr es opcional, si no está instalado las comparaciones numéricas se evalúan con numpy
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+
+# Palabras reservadas del lenguaje y su equivalente
+_PALABRAS = {
+    'and': 'and', 'y': 'and',
+    'or': 'or', 'o': 'or',
+    'not': 'not', 'no': 'not',
+    'in': 'in', 'en': 'in',
+    'between': 'between', 'entre': 'between',
+    }
+_LITERALES = {'true': True, 'verdadero': True, 'false': False, 'falso': False}
+_FUNCIONES = {
+    'isnull': 'isnull', 'nulo': 'isnull',
+    'notnull': 'notnull', 'no_nulo': 'notnull',
+    'match': 'match', 'coincide': 'match',
+    }
+_COMPARACIONES = {'==': '==', '=': '==', '!=': '!=', '<>': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<numero>\d+\.\d*|\.\d+|\d+)
+    |(?P<columna>`[^`]*`)
+    |(?P<texto>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+    |(?P<operador><=|>=|==|!=|<>|<|>|=|\+|-|\*|/|\(|\)|\[|\]|,)
+    |(?P<nombre>[^\W\d][\w.]*)
+    )""", re.VERBOSE)
+
+
+def _tokenizar(texto: str) -> List[tuple]:
+    '''
+    Separa la expresión en componentes (tipo, valor).
+
+    Args:
+        texto (str): Expresión.
+
+    Returns:
+        List[tuple]: Componentes de la expresión.
+    '''
+    tokens = []
+    posicion = 0
+    texto = texto.rstrip()
+    while posicion < len(texto):
+        encontrado = _TOKEN.match(texto, posicion)
+        if encontrado is None or encontrado.lastgroup is None:
+            raise ValueError(f"Carácter no válido en la posición {posicion} de la expresión: {texto}")
+        tipo, valor = encontrado.lastgroup, encontrado.group(encontrado.lastgroup)
+        if tipo == 'numero':
+            valor = float(valor) if '.' in valor else int(valor)
+        elif tipo == 'columna':
+            valor = valor[1:-1]
+        elif tipo == 'texto':
+            # Solo se eliminan los escapes de la comilla y de la barra, así las expresiones regulares se escriben sin duplicar barras
+            valor = re.sub(r"\\([\\'\"])", r"\1", valor[1:-1])
+        elif tipo == 'nombre' and valor.lower() in _PALABRAS:
+            tipo, valor = 'palabra', _PALABRAS[valor.lower()]
+        tokens.append((tipo, valor))
+        posicion = encontrado.end()
+    return tokens
+
+
+class _Analizador:
+    """Analizador descendente de la expresión, crea el árbol como tuplas anidadas
+
+    Nodos del árbol: ('columna', nombre), ('valor',), ('literal', valor), ('comparacion', op, izq, der),
+    ('en', nodo, valores, negado), ('entre', nodo, bajo, alto), ('aritmetica', op, izq, der), ('negativo', nodo),
+    ('y', hijos), ('o', hijos), ('no', nodo), ('funcion', nombre, argumentos)
+    """
+
+    def __init__(self, texto: str):
+        self.texto = texto
+        self.tokens = _tokenizar(texto)
+        self.posicion = 0
+
+    def _error(self, mensaje: str):
+        raise ValueError(f"{mensaje} en la expresión: {self.texto}")
+
+    def _ver(self, desplazamiento: int = 0) -> tuple:
+        indice = self.posicion + desplazamiento
+        return self.tokens[indice] if indice < len(self.tokens) else (None, None)
+
+    def _es(self, tipo: str, valor = None) -> bool:
+        actual = self._ver()
+        return actual[0] == tipo and (valor is None or actual[1] == valor)
+
+    def _tomar(self, tipo: Optional[str] = None, valor = None):
+        if tipo is not None and not self._es(tipo, valor):
+            self._error("Se esperaba '{}'".format(valor or tipo))
+        actual = self._ver()
+        self.posicion += 1
+        return actual[1]
+
+    def analizar(self) -> tuple:
+        if not self.tokens:
+            self._error("Expresión vacía")
+        arbol = self._o()
+        if self.posicion < len(self.tokens):
+            self._error("Sobra '{}'".format(self._ver()[1]))
+        return arbol
+
+    def _o(self) -> tuple:
+        hijos = [self._y()]
+        while self._es('palabra', 'or'):
+            self._tomar()
+            hijos.append(self._y())
+        return hijos[0] if len(hijos) == 1 else ('o', tuple(hijos))
+
+    def _y(self) -> tuple:
+        hijos = [self._no()]
+        while self._es('palabra', 'and'):
+            self._tomar()
+            hijos.append(self._no())
+        return hijos[0] if len(hijos) == 1 else ('y', tuple(hijos))
+
+    def _no(self) -> tuple:
+        if self._es('palabra', 'not'):
+            self._tomar()
+            return ('no', self._no())
+        return self._comparacion()
+
+    def _comparacion(self) -> tuple:
+        izquierda = self._suma()
+        tipo, valor = self._ver()
+        if tipo == 'operador' and valor in _COMPARACIONES:
+            self._tomar()
+            nodo = ('comparacion', _COMPARACIONES[valor], izquierda, self._suma())
+        elif self._es('palabra', 'in'):
+            self._tomar()
+            nodo = ('en', izquierda, self._lista(), False)
+        elif self._es('palabra', 'not') and self._ver(1) == ('palabra', 'in'):
+            self._tomar()
+            self._tomar()
+            nodo = ('en', izquierda, self._lista(), True)
+        elif self._es('palabra', 'between'):
+            self._tomar()
+            bajo = self._suma()
+            self._tomar('palabra', 'and')
+            nodo = ('entre', izquierda, bajo, self._suma())
+        else:
+            return izquierda
+        if self._ver()[0] == 'operador' and self._ver()[1] in _COMPARACIONES:
+            self._error("No se pueden encadenar comparaciones, use and")
+        return nodo
+
+    def _lista(self) -> tuple:
+        self._tomar('operador', '[')
+        valores = []
+        while not self._es('operador', ']'):
+            if valores:
+                self._tomar('operador', ',')
+            nodo = self._unario()
+            if nodo[0] == 'negativo' and nodo[1][0] == 'literal':
+                nodo = ('literal', -nodo[1][1])
+            if nodo[0] != 'literal':
+                self._error("Las listas solo pueden contener valores")
+            valores.append(nodo[1])
+        self._tomar('operador', ']')
+        return tuple(valores)
+
+    def _suma(self) -> tuple:
+        nodo = self._producto()
+        while self._ver()[0] == 'operador' and self._ver()[1] in ('+', '-'):
+            nodo = ('aritmetica', self._tomar(), nodo, self._producto())
+        return nodo
+
+    def _producto(self) -> tuple:
+        nodo = self._unario()
+        while self._ver()[0] == 'operador' and self._ver()[1] in ('*', '/'):
+            nodo = ('aritmetica', self._tomar(), nodo, self._unario())
+        return nodo
+
+    def _unario(self) -> tuple:
+        if self._es('operador', '-'):
+            self._tomar()
+            nodo = self._unario()
+            if nodo[0] == 'literal' and isinstance(nodo[1], (int, float)) and not isinstance(nodo[1], bool):
+                return ('literal', -nodo[1])
+            return ('negativo', nodo)
+        return self._atomo()
+
+    def _atomo(self) -> tuple:
+        tipo, valor = self._ver()
+        if tipo in ('numero', 'texto'):
+            self._tomar()
+            return ('literal', valor)
+        if tipo == 'columna':
+            self._tomar()
+            return ('columna', valor)
+        if tipo == 'nombre':
+            self._tomar()
+            if self._es('operador', '('):
+                return self._funcion(valor)
+            if valor.lower() in _LITERALES:
+                return ('literal', _LITERALES[valor.lower()])
+            if valor == 'valor':
+                return ('valor',)
+            return ('columna', valor)
+        if self._es('operador', '('):
+            self._tomar()
+            nodo = self._o()
+            self._tomar('operador', ')')
+            return nodo
+        self._error("Se esperaba un valor o una variable" if tipo is None else "'{}' no es válido".format(valor))
+
+    def _funcion(self, nombre: str) -> tuple:
+        if nombre.lower() not in _FUNCIONES:
+            self._error(f"La función '{nombre}' no existe")
+        self._tomar('operador', '(')
+        argumentos = []
+        while not self._es('operador', ')'):
+            if argumentos:
+                self._tomar('operador', ',')
+            argumentos.append(self._o())
+        self._tomar('operador', ')')
+        nombre = _FUNCIONES[nombre.lower()]
+        if len(argumentos) != (2 if nombre == 'match' else 1):
+            self._error(f"Número de argumentos no válido para '{nombre}'")
+        if nombre == 'match' and (argumentos[1][0] != 'literal' or not isinstance(argumentos[1][1], str)):
+            self._error("El segundo argumento de match debe ser una expresión regular entre comillas")
+        return ('funcion', nombre, tuple(argumentos))
+
+
+@lru_cache(maxsize = None)
+def compilar_expresion(texto: str) -> tuple:
+    '''
+    Analiza la expresión y devuelve su árbol. El resultado se guarda, por lo que cada expresión se analiza una sola vez.
+
+    Args:
+        texto (str): Expresión.
+
+    Returns:
+        tuple: Árbol de la expresión.
+    '''
+    return _Analizador(texto).analizar()
+
+
+def columnas_expresion(texto: str) -> List[str]:
+    '''
+    Lista las variables que usa la expresión, sin incluir `valor`.
+
+    Args:
+        texto (str): Expresión.
+
+    Returns:
+        List[str]: Variables en el orden en que aparecen.
+    '''
+    columnas = []
+    
+    def recorrer(nodo: tuple):
+        if nodo[0] == 'columna':
+            columnas.append(nodo[1])
+        elif nodo[0] in ('y', 'o'):
+            for hijo in nodo[1]:
+                recorrer(hijo)
+        elif nodo[0] in ('comparacion', 'aritmetica'):
+            recorrer(nodo[2])
+            recorrer(nodo[3])
+        elif nodo[0] == 'entre':
+            for hijo in nodo[1:]:
+                recorrer(hijo)
+        elif nodo[0] in ('en', 'no', 'negativo'):
+            recorrer(nodo[1])
+        elif nodo[0] == 'funcion':
+            recorrer(nodo[2][0])
+    
+    recorrer(compilar_expresion(texto))
+    return list(dict.fromkeys(columnas))
+
+
+def _es_nulo(valor) -> bool:
+    # Valores vacíos de la malla (null en el JSON o NaN del Excel)
+    return valor is None or (isinstance(valor, float) and np.isnan(valor))
+
+
+def _literal(valor) -> str:
+    # Escribe un valor de la malla como literal de la expresión, la sintaxis no tiene literal para los valores vacíos
+    if _es_nulo(valor):
+        raise ValueError("Un valor vacío no se puede escribir como literal de la expresión, use isnull(variable)")
+    if isinstance(valor, bool):
+        return 'true' if valor else 'false'
+    if isinstance(valor, (int, float)):
+        return repr(valor)
+    return "'{}'".format(str(valor).replace('\\', '\\\\').replace("'", "\\'"))
+
+
+def traducir_condicion(diccionario: Dict[str, List], iand: bool = False) -> str:
+    '''
+    Traduce una condición de la malla en formato de diccionario a una expresión equivalente.
+
+    Cada variable se compara con `in` contra su lista de valores, salvo las variables de Edad que se comparan con
+    `>` contra el primer valor. Un valor vacío en la lista se traduce como isnull(variable), y una Edad comparada con
+    un valor vacío es false, igual que con isin y > sobre los datos. Las condiciones se unen con and si iand es True y
+    con or en otro caso.
+
+    Args:
+        diccionario (Dict[str, List]): Condición en formato {variable: [valores]}.
+        iand (bool): Indica si se deben cumplir todas las condiciones.
+
+    Returns:
+        str: Expresión de la condición.
+    '''
+    partes = []
+    for col, valores in diccionario.items():
+        if 'Edad' in col:
+            partes.append('false' if _es_nulo(valores[0]) else "`{}` > {}".format(col, _literal(valores[0])))
+        else:
+            valores = list(valores or [])
+            parte = "`{}` in [{}]".format(col, ', '.join(_literal(i) for i in valores if not _es_nulo(i)))
+            if any(_es_nulo(i) for i in valores):
+                parte = "({} or isnull(`{}`))".format(parte, col)
+            partes.append(parte)
+    return (' and ' if iand else ' or ').join(partes)
+
+
+def unir_condiciones(actual: Optional[Union[Dict, str]], nueva: Optional[Union[Dict, str]], iand: bool = False) -> Optional[Union[Dict, str]]:
+    '''
+    Une dos condiciones de la malla. Si las dos son diccionarios se unen en un diccionario, en otro caso se unen como
+    expresión con and si iand es True y con or en otro caso.
+
+    Args:
+        actual (Optional[Union[Dict, str]]): Condición actual de la variable.
+        nueva (Optional[Union[Dict, str]]): Condición que se añade.
+        iand (bool): Indica si se deben cumplir todas las condiciones.
+
+    Returns:
+        Optional[Union[Dict, str]]: Condición resultante.
+    '''
+    if actual is None:
+        return nueva
+    if nueva is None:
+        return actual
+    if isinstance(actual, dict) and isinstance(nueva, dict):
+        return {**actual, **nueva}
+    textos = [i if isinstance(i, str) else traducir_condicion(i, iand) for i in (actual, nueva)]
+    return '({}) {} ({})'.format(textos[0], 'and' if iand else 'or', textos[1])
+
+
+def _a_numero(valor, n: int) -> Union[np.ndarray, float]:
+    # Convierte una columna o un literal a números de tipo float, los valores vacíos o no numéricos quedan como NaN
+    if isinstance(valor, pd.Series):
+        if isinstance(valor.dtype, pd.CategoricalDtype):
+            valor = valor.astype(object)
+        if not pd.api.types.is_numeric_dtype(valor):
+            valor = pd.to_numeric(valor, errors = 'coerce')
+        return valor.to_numpy(dtype = 'float64', na_value = np.nan)
+    if isinstance(valor, np.ndarray):
+        return valor.astype('float64')
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _es_numerica(serie: pd.Series) -> bool:
+    # Columnas numéricas, o categóricas con categorías numéricas
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return pd.api.types.is_numeric_dtype(serie.cat.categories)
+    return pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie)
+
+
+class _Evaluador:
+    """Evalúa el árbol de una expresión sobre un DataFrame y devuelve arreglos booleanos del largo de los datos"""
+
+    _ORDEN = ('<', '<=', '>', '>=')
+
+    def __init__(self, data: pd.DataFrame, valor: Optional[pd.Series] = None):
+        self.data = data
+        self.valor = valor
+        self.n = len(data)
+
+    def columna(self, nodo: tuple) -> pd.Series:
+        if nodo[0] == 'valor':
+            if self.valor is None:
+                raise ValueError("La variable 'valor' solo se puede usar en los valores de la malla")
+            return self.valor
+        try:
+            return self.data[nodo[1]]
+        except KeyError as e:
+            raise ValueError(f"Error al acceder a la columna '{nodo[1]}' en el DataFrame de datos") from e
+
+    # Identificación de las partes numéricas de la expresión
+
+    def es_valor_numerico(self, nodo: tuple) -> bool:
+        if nodo[0] in ('aritmetica', 'negativo'):
+            return True
+        if nodo[0] == 'literal':
+            return isinstance(nodo[1], (int, float)) and not isinstance(nodo[1], bool)
+        if nodo[0] in ('columna', 'valor'):
+            return _es_numerica(self.columna(nodo))
+        return False
+
+    def es_fusionable(self, nodo: tuple) -> bool:
+        tipo = nodo[0]
+        if tipo == 'comparacion':
+            if nodo[1] in self._ORDEN:
+                return all(self.es_valor(i) for i in nodo[2:])
+            return self.es_valor_numerico(nodo[2]) and self.es_valor_numerico(nodo[3])
+        if tipo == 'entre':
+            return all(self.es_valor(i) for i in nodo[1:])
+        if tipo in ('y', 'o'):
+            return all(self.es_fusionable(i) for i in nodo[1])
+        if tipo == 'no':
+            return self.es_fusionable(nodo[1])
+        return False
+
+    @staticmethod
+    def es_valor(nodo: tuple) -> bool:
+        return nodo[0] in ('columna', 'valor', 'literal', 'aritmetica', 'negativo')
+
+    # Evaluación de las partes numéricas en un solo recorrido
+
+    def fusionar(self, nodo: tuple) -> np.ndarray:
+        if numexpr is None:
+            with np.errstate(all = 'ignore'):
+                resultado = self.numerico(nodo)
+        else:
+            variables = {}
+            texto = self.a_numexpr(nodo, variables, {})
+            resultado = numexpr.evaluate(texto, local_dict = variables)
+        return np.broadcast_to(resultado, (self.n,))
+
+    def a_numexpr(self, nodo: tuple, variables: Dict[str, np.ndarray], nombres: Dict[Optional[str], str]) -> str:
+        tipo = nodo[0]
+        if tipo in ('columna', 'valor'):
+            # Cada variable distinta se convierte a número una sola vez
+            nombre = None if tipo == 'valor' else nodo[1]
+            if nombre not in nombres:
+                nombres[nombre] = f'v{len(nombres)}'
+                variables[nombres[nombre]] = _a_numero(self.columna(nodo), self.n)
+            return nombres[nombre]
+        if tipo == 'literal':
+            numero = _a_numero(nodo[1], self.n)
+            if np.isfinite(numero):
+                return repr(numero)
+            # numexpr no tiene literales NaN, se entregan como variable
+            variables[f'c{len(variables)}'] = np.full(self.n, numero)
+            return f'c{len(variables) - 1}'
+        if tipo == 'aritmetica':
+            return '({} {} {})'.format(self.a_numexpr(nodo[2], variables, nombres), nodo[1], self.a_numexpr(nodo[3], variables, nombres))
+        if tipo == 'negativo':
+            return '(-{})'.format(self.a_numexpr(nodo[1], variables, nombres))
+        if tipo == 'comparacion':
+            izquierda, derecha = self.a_numexpr(nodo[2], variables, nombres), self.a_numexpr(nodo[3], variables, nombres)
+            if nodo[1] == '!=':
+                return '(~({} == {}))'.format(izquierda, derecha)
+            return '({} {} {})'.format(izquierda, nodo[1], derecha)
+        if tipo == 'entre':
+            x, bajo, alto = (self.a_numexpr(i, variables, nombres) for i in nodo[1:])
+            return '(({0} >= {1}) & ({0} <= {2}))'.format(x, bajo, alto)
+        if tipo in ('y', 'o'):
+            return '({})'.format((' & ' if tipo == 'y' else ' | ').join(self.a_numexpr(i, variables, nombres) for i in nodo[1]))
+        return '(~{})'.format(self.a_numexpr(nodo[1], variables, nombres))
+
+    def numerico(self, nodo: tuple):
+        tipo = nodo[0]
+        if tipo in ('columna', 'valor'):
+            return _a_numero(self.columna(nodo), self.n)
+        if tipo == 'literal':
+            return _a_numero(nodo[1], self.n)
+        if tipo == 'aritmetica':
+            izquierda, derecha = self.numerico(nodo[2]), self.numerico(nodo[3])
+            return {'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.true_divide}[nodo[1]](izquierda, derecha)
+        if tipo == 'negativo':
+            return -self.numerico(nodo[1])
+        if tipo == 'comparacion':
+            izquierda, derecha = self.numerico(nodo[2]), self.numerico(nodo[3])
+            if nodo[1] == '!=':
+                return ~(izquierda == derecha)
+            return {'==': np.equal, '<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal}[nodo[1]](izquierda, derecha)
+        if tipo == 'entre':
+            x, bajo, alto = (self.numerico(i) for i in nodo[1:])
+            return (x >= bajo) & (x <= alto)
+        if tipo in ('y', 'o'):
+            operacion = np.logical_and if tipo == 'y' else np.logical_or
+            resultado = self.numerico(nodo[1][0])
+            for hijo in nodo[1][1:]:
+                resultado = operacion(resultado, self.numerico(hijo))
+            return resultado
+        return ~np.asarray(self.numerico(nodo[1]), dtype = bool)
+
+    # Evaluación general
+
+    def condicion(self, nodo: tuple) -> np.ndarray:
+        tipo = nodo[0]
+        if self.es_fusionable(nodo):
+            return self.fusionar(nodo)
+        if tipo in ('y', 'o'):
+            # Las condiciones numéricas se evalúan juntas y las demás una por una
+            fusionables = [i for i in nodo[1] if self.es_fusionable(i)]
+            partes = [self.condicion(i) for i in nodo[1] if not self.es_fusionable(i)]
+            if len(fusionables) == 1:
+                partes.append(self.fusionar(fusionables[0]))
+            elif fusionables:
+                partes.append(self.fusionar((tipo, tuple(fusionables))))
+            operacion = np.logical_and if tipo == 'y' else np.logical_or
+            resultado = partes[0]
+            for parte in partes[1:]:
+                resultado = operacion(resultado, parte)
+            return resultado
+        if tipo == 'no':
+            return ~self.condicion(nodo[1])
+        if tipo == 'comparacion':
+            if nodo[1] in self._ORDEN:
+                return self.fusionar(nodo)
+            igual = self.igualdad(nodo[2], nodo[3])
+            return ~igual if nodo[1] == '!=' else igual
+        if tipo == 'entre':
+            return self.fusionar(nodo)
+        if tipo == 'en':
+            resultado = self.pertenece(nodo[1], list(nodo[2]))
+            return ~resultado if nodo[3] else resultado
+        if tipo == 'funcion':
+            return self.funcion(nodo)
+        # Una variable o un literal sola es verdadera si su valor es verdadero
+        valor = self.valor_de(nodo)
+        if isinstance(valor, pd.Series):
+            # Las columnas categóricas no aceptan False como valor de relleno
+            return valor.astype(object).fillna(False).astype(bool).to_numpy()
+        return np.full(self.n, bool(valor))
+
+    def valor_de(self, nodo: tuple):
+        if nodo[0] in ('columna', 'valor'):
+            return self.columna(nodo)
+        if nodo[0] == 'literal':
+            return nodo[1]
+        if nodo[0] in ('aritmetica', 'negativo'):
+            with np.errstate(all = 'ignore'):
+                return pd.Series(np.broadcast_to(self.numerico(nodo), (self.n,)), index = self.data.index)
+        return pd.Series(self.condicion(nodo), index = self.data.index)
+
+    def igualdad(self, nodo_izquierdo: tuple, nodo_derecho: tuple) -> np.ndarray:
+        izquierda, derecha = self.valor_de(nodo_izquierdo), self.valor_de(nodo_derecho)
+        if not isinstance(izquierda, pd.Series):
+            izquierda, derecha = derecha, izquierda
+        if not isinstance(izquierda, pd.Series):
+            return np.full(self.n, izquierda == derecha)
+        if isinstance(derecha, pd.Series):
+            # Dos columnas categóricas con categorías distintas no se pueden comparar directamente
+            izquierda, derecha = izquierda.astype(object), derecha.astype(object)
+            nulos = (izquierda.isna() | derecha.isna()).to_numpy()
+            return (izquierda.to_numpy() == derecha.to_numpy()) & ~nulos
+        try:
+            resultado = izquierda == derecha
+        except TypeError:
+            resultado = izquierda.astype(object) == derecha
+        return resultado.fillna(False).to_numpy(dtype = bool)
+
+    def pertenece(self, nodo: tuple, valores: List) -> np.ndarray:
+        valor = self.valor_de(nodo)
+        if isinstance(valor, pd.Series):
+            return valor.isin(valores).to_numpy(dtype = bool)
+        return np.full(self.n, valor in valores)
+
+    def funcion(self, nodo: tuple) -> np.ndarray:
+        nombre, argumentos = nodo[1], nodo[2]
+        valor = self.valor_de(argumentos[0])
+        if not isinstance(valor, pd.Series):
+            valor = pd.Series([valor] * self.n, index = self.data.index, dtype = object)
+        if nombre == 'isnull':
+            return valor.isna().to_numpy()
+        if nombre == 'notnull':
+            return valor.notna().to_numpy()
+        # Un valor vacío no coincide con ninguna expresión regular, sin convertirlo al texto 'None' o 'nan'
+        return valor.astype(str).str.match(argumentos[1][1]).fillna(False).to_numpy(dtype = bool) & valor.notna().to_numpy()
+
+
+def evaluar_expresion(texto: str, data: pd.DataFrame, valor: Optional[pd.Series] = None) -> pd.Series:
+    '''
+    Evalúa una expresión de la malla sobre los datos.
+
+    Args:
+        texto (str): Expresión.
+        data (pd.DataFrame): DataFrame de datos.
+        valor (Optional[pd.Series]): Columna que se está validando, se usa en la expresión como `valor`.
+
+    Returns:
+        pd.Series: Serie booleana con el resultado de la expresión para cada registro.
+    '''
+    arbol = compilar_expresion(texto)
+    resultado = _Evaluador(data, valor).condicion(arbol)
+    return pd.Series(np.asarray(resultado, dtype = bool), index = data.index)
@@ -0,0 +1,289 @@
+import threading
+import queue
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from typing import List, Dict, Tuple, Iterable, Iterator, Optional, Callable
+import pandas as pd
+from validationgrid.read import normalizar_respuestas, expandir_columnas_adicionales
+from validationgrid.valgrid import malla_validacion, unir_resultados_lotes, categorizar_valores
+
+
+# Marca que indica a cada etapa que no hay más lotes por procesar
+_FIN = object()
+
+# Tiempo máximo en segundos que una etapa espera en una cola antes de revisar si el pipeline se detuvo
+_ESPERA_COLA = 0.1
+
+
+class _PipelineDetenido(Exception):
+    """Excepción interna para terminar las etapas cuando otra etapa falló"""
+
+
+def aplanar_lote(registros: List[dict])-> pd.DataFrame:
+    """Etapa que normaliza un lote de registros del Sincronizador y lo expande por integrante
+
+    Args:
+        registros (List[dict]): Lote de registros
+
+    Returns:
+        pd.DataFrame: Lote normalizado
+    """
+    return normalizar_respuestas(registros)
+
+
+def expandir_lote(dataframe: pd.DataFrame, malla: dict, esquema: Dict[str, List])-> pd.DataFrame:
+    """Etapa que expande las columnas adicionales de un lote según la malla y convierte a categóricas las variables con valores cerrados
+
+    Args:
+        dataframe (pd.DataFrame): Lote normalizado
+        malla (dict): Malla de validación
+        esquema (Dict[str, List]): Columnas a expandir y columnas de su expansión en todos los lotes (ver esquema_expansion_lotes)
+
+    Returns:
+        pd.DataFrame: Lote expandido
+    """
+    dataframe = expandir_columnas_adicionales(dataframe, malla = malla, esquema = esquema)
+    return categorizar_valores(dataframe, malla)
+
+
+def validar_lote(dataframe: pd.DataFrame, malla: dict)-> Tuple[pd.DataFrame, List]:
+    """Etapa que aplica la malla de validación a un lote
+
+    Args:
+        dataframe (pd.DataFrame): Lote expandido
+        malla (dict): Malla de validación
+
+    Returns:
+        Tuple[pd.DataFrame, List]: Validación del lote y lista de columnas obligatorias
+    """
+    resultado = malla_validacion(data = dataframe, guia_validacion = malla)
+    if resultado is None:
+        raise ValueError("La malla de validación no pudo validar el lote")
+    return resultado
+
+
+class EstadisticaEtapa:
+    """Contador de lotes, filas y tiempo de una etapa del pipeline, junto con la profundidad de su cola de entrada"""
+
+    def __init__(self, nombre: str, cola: Optional[queue.Queue] = None):
+        self.nombre = nombre
+        self.cola = cola
+        self.lotes = 0
+        self.filas = 0
+        self.segundos_ocupado = 0.0
+        self.cola_maxima = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, duracion: float, filas: int):
+        with self._lock:
+            self.lotes += 1
+            self.filas += filas
+            self.segundos_ocupado += duracion
+
+    def registrar_cola(self):
+        if self.cola is not None:
+            with self._lock:
+                self.cola_maxima = max(self.cola_maxima, self.cola.qsize())
+
+    def como_diccionario(self, transcurrido: float)-> dict:
+        with self._lock:
+            return {
+                'lotes': self.lotes,
+                'filas': self.filas,
+                'segundos_ocupado': self.segundos_ocupado,
+                'lotes_por_segundo': self.lotes / transcurrido if transcurrido > 0 else 0.0,
+                'filas_por_segundo': self.filas / transcurrido if transcurrido > 0 else 0.0,
+                'cola': self.cola.qsize() if self.cola is not None else 0,
+                'cola_maxima': self.cola_maxima,
+                }
+
+
+class PipelineValidacion:
+    """Ejecuta en paralelo las etapas descarga -> aplanar -> expandir -> validar sobre lotes de hogares
+
+    Cada etapa se comunica con la siguiente por una cola de tamaño fijo, de modo que una etapa rápida se bloquea
+    (contrapresión) en lugar de acumular lotes en memoria. La descarga corre en su propio hilo; las etapas de cálculo
+    corren en `trabajadores` hilos cada una y, si `usar_procesos` es True, delegan el trabajo a un pool de procesos.
+    Al final los resultados se unen en el orden original de los lotes. Una misma instancia se puede ejecutar varias veces,
+    las colas y estadísticas se reinician en cada ejecución.
+
+    Args:
+        malla (dict): Malla de validación
+        esquema (Dict[str, List]): Columnas a expandir y columnas de su expansión, calculadas sobre todos los lotes (ver
+        esquema_expansion_lotes), para que cada lote tenga las columnas de la validación completa
+        tamano_cola (int): Número máximo de lotes en espera entre dos etapas
+        trabajadores (int): Número de hilos por etapa de cálculo
+        usar_procesos (bool): Si es True, las etapas de cálculo se ejecutan en un pool de procesos
+    """
+
+    ETAPAS = ['descarga', 'aplanar', 'expandir', 'validar', 'union']
+
+    def __init__(self, malla: dict, esquema: Dict[str, List], tamano_cola: int = 4, trabajadores: int = 2, usar_procesos: bool = False):
+        self.malla = malla
+        self.esquema = esquema
+        self.tamano_cola = tamano_cola
+        self.trabajadores = trabajadores
+        self.usar_procesos = usar_procesos
+        self._detener = threading.Event()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        # Cada ejecución empieza con colas vacías, estadísticas en cero y sin la señal de detención de la ejecución anterior
+        self._colas = {etapa: queue.Queue(maxsize = self.tamano_cola) for etapa in self.ETAPAS[1:]}
+        self._estadisticas = {etapa: EstadisticaEtapa(etapa, self._colas.get(etapa)) for etapa in self.ETAPAS}
+        self._detener.clear()
+        self._error = None
+        self._inicio = None
+        self._fin = None
+
+    def estadisticas(self)-> Dict[str, dict]:
+        """Devuelve para cada etapa los lotes y filas procesadas, el tiempo ocupado, el rendimiento y la profundidad actual y máxima de su cola de entrada.
+
+        Se puede consultar desde otro hilo mientras el pipeline está corriendo.
+
+        Returns:
+            Dict[str, dict]: Estadísticas por etapa
+        """
+        if self._inicio is None:
+            transcurrido = 0.0
+        else:
+            transcurrido = (self._fin or time.perf_counter()) - self._inicio
+        return {etapa: estadistica.como_diccionario(transcurrido) for etapa, estadistica in self._estadisticas.items()}
+
+    def _poner(self, etapa: str, elemento):
+        # Se espera espacio en la cola revisando periódicamente si otra etapa falló
+        cola = self._colas[etapa]
+        while True:
+            if self._detener.is_set():
+                raise _PipelineDetenido()
+            try:
+                cola.put(elemento, timeout = _ESPERA_COLA)
+                self._estadisticas[etapa].registrar_cola()
+                return
+            except queue.Full:
+                continue
+
+    def _tomar(self, etapa: str):
+        cola = self._colas[etapa]
+        while True:
+            if self._detener.is_set():
+                raise _PipelineDetenido()
+            try:
+                return cola.get(timeout = _ESPERA_COLA)
+            except queue.Empty:
+                continue
+
+    def _fallar(self, error: BaseException):
+        if self._error is None:
+            self._error = error
+        self._detener.set()
+
+    def _descargar(self, lotes: Iterable[List[dict]]):
+        try:
+            iterador = iter(lotes)
+            secuencia = 0
+            while True:
+                inicio = time.perf_counter()
+                lote = next(iterador, _FIN)
+                if lote is _FIN:
+                    break
+                self._estadisticas['descarga'].registrar(time.perf_counter() - inicio, len(lote))
+                self._poner('aplanar', (secuencia, lote))
+                secuencia += 1
+            self._poner('aplanar', _FIN)
+        except _PipelineDetenido:
+            pass
+        except BaseException as e:
+            self._fallar(e)
+
+    def _trabajar(self, etapa: str, siguiente: str, funcion: Callable, executor: Optional[Executor], restantes: List[int], lock: threading.Lock):
+        try:
+            while True:
+                elemento = self._tomar(etapa)
+                if elemento is _FIN:
+                    # Se devuelve la marca para los demás hilos de la etapa y el último en terminar la retira de la cola
+                    # y avisa a la siguiente etapa
+                    with lock:
+                        restantes[0] -= 1
+                        ultimo = restantes[0] == 0
+                    if ultimo:
+                        self._poner(siguiente, _FIN)
+                    else:
+                        self._poner(etapa, _FIN)
+                    return
+
+                secuencia, dato = elemento
+                inicio = time.perf_counter()
+                if executor is None:
+                    resultado = funcion(dato)
+                else:
+                    resultado = executor.submit(funcion, dato).result()
+                filas = len(resultado[0]) if isinstance(resultado, tuple) else len(resultado)
+                self._estadisticas[etapa].registrar(time.perf_counter() - inicio, filas)
+                self._poner(siguiente, (secuencia, resultado))
+        except _PipelineDetenido:
+            pass
+        except BaseException as e:
+            self._fallar(e)
+
+    def _resultados_en_orden(self)-> Iterator[Tuple[pd.DataFrame, List]]:
+        # Los lotes pueden llegar desordenados cuando hay varios trabajadores, se entregan en el orden de descarga
+        pendientes = {}
+        esperado = 0
+        while True:
+            elemento = self._tomar('union')
+            if elemento is _FIN:
+                break
+            secuencia, resultado = elemento
+            pendientes[secuencia] = resultado
+            while esperado in pendientes:
+                resultado = pendientes.pop(esperado)
+                # El tiempo entre la entrega de un lote y la solicitud del siguiente es el tiempo de la unión
+                inicio = time.perf_counter()
+                yield resultado
+                self._estadisticas['union'].registrar(time.perf_counter() - inicio, len(resultado[0]))
+                esperado += 1
+
+    def ejecutar(self, lotes: Iterable[List[dict]])-> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Ejecuta el pipeline sobre una secuencia de lotes de registros del Sincronizador.
+
+        Args:
+            lotes (Iterable[List[dict]]): Lotes de registros (hogares completos). La iteración se hace en el hilo de descarga.
+
+        Returns:
+            Validos, No_Validos: Tupla con el dataframe de participantes con valores correctos y el dataframe de participantes con valores erroneos.
+        """
+        self._reiniciar()
+        executor = ProcessPoolExecutor(max_workers = self.trabajadores) if self.usar_procesos else None
+        funciones = [
+            ('aplanar', 'expandir', aplanar_lote),
+            ('expandir', 'validar', partial(expandir_lote, malla = self.malla, esquema = self.esquema)),
+            ('validar', 'union', partial(validar_lote, malla = self.malla)),
+            ]
+
+        self._inicio = time.perf_counter()
+        hilos = [threading.Thread(target = self._descargar, args = (lotes,), name = 'descarga', daemon = True)]
+        for etapa, siguiente, funcion in funciones:
+            restantes, lock = [self.trabajadores], threading.Lock()
+            for i in range(self.trabajadores):
+                hilos.append(threading.Thread(target = self._trabajar, args = (etapa, siguiente, funcion, executor, restantes, lock), name = f'{etapa}-{i}', daemon = True))
+        for hilo in hilos:
+            hilo.start()
+
+        try:
+            print("MALLA DE VALIDACIÓN")
+            resultado = unir_resultados_lotes(self._resultados_en_orden())
+        except _PipelineDetenido:
+            raise self._error
+        finally:
+            self._detener.set()
+            for hilo in hilos:
+                hilo.join()
+            if executor is not None:
+                executor.shutdown()
+            self._fin = time.perf_counter()
+
+        if self._error is not None:
+            raise self._error
+        return resultado
@@ -1,25 +1,103 @@
 import requests
-from typing import List, Dict
+from typing import List, Dict, Iterator, Iterable, Optional, Tuple
 import pandas as pd
 import numpy as np
 import os
 import json
+import mmap
+import gzip
+import codecs
+import random
+import time
 
 
-def get_response(id_encuesta: str, header = Dict[str, str])-> List[dict]:
+# Dirección base del API del Sincronizador, se puede cambiar con la variable de entorno URL_API_SINCRONIZADOR
+URL_API = os.environ.get('URL_API_SINCRONIZADOR', "https://as-rit-api-prod.azurewebsites.net")
+
+# Número de reintentos cuando el API responde 429 (demasiadas solicitudes) o 503, y espera máxima en segundos entre reintentos
+REINTENTOS_API = 3
+ESPERA_MAXIMA_REINTENTO = 30.0
+
+# Tiempo máximo en segundos para conectarse al API y para recibir cada parte de la respuesta, una solicitud que supera
+# alguno de los dos se reintenta igual que una respuesta 429 o 503
+TIEMPO_ESPERA_API = (10.0, 300.0)
+
+# Tamaño en bytes de los bloques que se decodifican en cada lectura de un archivo exportado
+TAMANO_BLOQUE_LECTURA = 1 << 20
+
+
+def url_resultados(id_encuesta: str, url_api: Optional[str] = None)-> str:
+    """Función que construye la dirección de los resultados de una encuesta en el API del Sincronizador
+
+    Args:
+        id_encuesta (str): Id de la encuesta
+        url_api (Optional[str]): Dirección base del API, por defecto URL_API
+
+    Returns:
+        str: Dirección de los resultados
+    """
+    return f"{(url_api or URL_API).rstrip('/')}/api/Sincronizador/resultados?id={id_encuesta}"
+
+
+def _espera_reintento(response: requests.Response, intento: int)-> float:
+    # Se respeta el encabezado Retry-After si viene en segundos, en otro caso la espera se duplica en cada intento
+    try:
+        espera = float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        espera = 2.0 ** intento
+    return min(max(espera, 0.0), ESPERA_MAXIMA_REINTENTO)
+
+
+def solicitar_resultados(id_encuesta: str, header: Dict[str, str], url_api: Optional[str] = None, stream: bool = False,
+                         reintentos: int = REINTENTOS_API, timeout: Tuple[float, float] = TIEMPO_ESPERA_API)-> requests.Response:
+    """Función que solicita los resultados de una encuesta al API, reintentando si el API responde 429 o 503 o no responde a tiempo
+
+    Args:
+        id_encuesta (str): Id de la encuesta sobre la que se va a tomar la informacion
+        header (Dict[str, str]): Encabezados de la solicitud (token de acceso)
+        url_api (Optional[str]): Dirección base del API, por defecto URL_API
+        stream (bool): Si es True, el contenido se descarga a medida que se lee
+        reintentos (int): Número máximo de reintentos
+        timeout (Tuple[float, float]): Segundos máximos para conectarse y para recibir cada parte de la respuesta
+
+    Returns:
+        requests.Response: Respuesta del API
+
+    Raises:
+        requests.exceptions.RequestException: Si la solicitud falla o el API responde con error después de los reintentos
+    """
+    url = url_resultados(id_encuesta, url_api)
+    for intento in range(reintentos + 1):
+        try:
+            response = requests.get(url = url, headers = header, stream = stream, timeout = timeout)
+        except requests.exceptions.Timeout:
+            # Sin respuesta no hay Retry-After, la espera se duplica en cada intento
+            if intento == reintentos:
+                raise
+            time.sleep(min(2.0 ** intento, ESPERA_MAXIMA_REINTENTO))
+            continue
+        if response.status_code not in (429, 503) or intento == reintentos:
+            break
+        espera = _espera_reintento(response, intento)
+        response.close()
+        time.sleep(espera)
+    response.raise_for_status()
+    return response
+
+
+def get_response(id_encuesta: str, header = Dict[str, str], url_api: Optional[str] = None)-> List[dict]:
     """Función que ingresa al API determinado y obtiene la información de tipo JSON
 
     Args:
         id_encuesta (str): Id de la encuesta sobre la que se va a tomar la informacion 
+        url_api (Optional[str]): Dirección base del API, por defecto URL_API
 
     Returns:
         list: Lista de respuestas o registros obtenidos desde el API
     """
     
-    url = f"https://as-rit-api-prod.azurewebsites.net/api/Sincronizador/resultados?id={id_encuesta}"
     try:
-        response = requests.get(url = url, headers = header)
-        response.raise_for_status()
+        response = solicitar_resultados(id_encuesta, header, url_api = url_api)
         json_data = response.json()
         return json_data
     
@@ -58,22 +136,324 @@ def explode_integrantes(dataframe : pd.DataFrame)-> pd.DataFrame:
         print("Normalización del DataFrame Cancelada.")
         return pd.DataFrame()
     
-def read__dataframe(id_encuesta: str, header = Dict[str,str])-> pd.DataFrame:
-    """Función que realiza el request al API en la encuesta determinada por el id_enciesta y lo convierte en un dataframe
+def normalizar_respuestas(response: List[dict])-> pd.DataFrame:
+    """Función que convierte una lista de registros del Sincronizador en el dataframe expandido por integrante
 
     Args:
-        id_encuesta (str): Id de la encuesta sobre la que se van a revisar los datos
+        response (List[dict]): Lista de registros tal como los entrega el API
 
     Returns:
-        pd.DataFrame: Dataframe resultante
+        pd.DataFrame: Dataframe normalizado y expandido por integrante
     """
-    response = get_response(id_encuesta = id_encuesta, header=header)
     try:
         data = pd.json_normalize(response)
         data = explode_integrantes(dataframe = data)
         return data
     except Exception as e:
         raise e
+
+
+def normalizar_hogares_integrantes(response: List[dict])-> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Función que convierte una lista de registros del Sincronizador en una tabla de hogares y una tabla de integrantes
+
+    A diferencia de normalizar_respuestas, las respuestas del hogar no se repiten en cada integrante. La tabla de integrantes
+    tiene la columna fila_hogar con la posición de su hogar en la tabla de hogares. Un hogar sin integrantes tiene un
+    integrante con todas las respuestas vacías, igual que en la expansión por integrante.
+
+    Args:
+        response (List[dict]): Lista de registros tal como los entrega el API
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: Tabla de hogares y tabla de integrantes
+    """
+    try:
+        hogares = pd.json_normalize(response)
+        if 'respuestas.integrante' in hogares.columns:
+            listas = hogares.pop('respuestas.integrante')
+        else:
+            listas = pd.Series([[] for _ in range(len(hogares))], index = hogares.index, dtype = object)
+        
+        # Cada integrante queda asociado a la fila de su hogar
+        integrante = listas.explode()
+        integrantes = pd.json_normalize([i if isinstance(i, dict) else {} for i in integrante])
+        integrantes = integrantes.rename(columns={'identificacion':'identificacion_integrante'})
+        integrantes.insert(0, 'fila_hogar', integrante.index.to_numpy())
+        
+        hogares = hogares.rename(columns = lambda x: x.replace('respuestas.', ''))
+        integrantes = integrantes.rename(columns = lambda x: x.replace('respuestas.', ''))
+        return hogares, integrantes
+    except Exception as e:
+        raise e
+
+
+def read__dataframe(id_encuesta: str, header = Dict[str,str], url_api: Optional[str] = None)-> pd.DataFrame:
+    """Función que realiza el request al API en la encuesta determinada por el id_enciesta y lo convierte en un dataframe
+
+    Args:
+        id_encuesta (str): Id de la encuesta sobre la que se van a revisar los datos
+        url_api (Optional[str]): Dirección base del API, por defecto URL_API
+
+    Returns:
+        pd.DataFrame: Dataframe resultante
+    """
+    response = get_response(id_encuesta = id_encuesta, header=header, url_api = url_api)
+    return normalizar_respuestas(response)
+
+
+def _decodificar_registros(fuente, tamano_bloque: int = TAMANO_BLOQUE_LECTURA)-> Iterator[dict]:
+    """Función que decodifica por bloques los registros de una fuente de bytes con método read (archivo, mapa de memoria o respuesta HTTP)
+
+    Args:
+        fuente: Objeto con método read(n) que entrega bytes
+        tamano_bloque (int): Número de bytes que se decodifican en cada lectura
+
+    Returns:
+        Iterator[dict]: Registros de la fuente, tanto si es un arreglo JSON como si es NDJSON o una secuencia de arreglos
+        JSON (respuestas del API concatenadas). Si después de un arreglo hay contenido que no es JSON se lanza JSONDecodeError
+    """
+    decoder = json.JSONDecoder()
+    lector = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    posicion = 0
+    fin = False
+    en_arreglo = None
+    
+    while True:
+        # Se omiten espacios y separadores entre registros
+        while posicion < len(buffer) and (buffer[posicion].isspace() or (en_arreglo and buffer[posicion] == ',')):
+            posicion += 1
+        
+        # Si se consumió el bloque actual se lee el siguiente
+        if posicion >= len(buffer):
+            if fin:
+                break
+            bloque = fuente.read(tamano_bloque)
+            fin = not bloque
+            buffer = lector.decode(bloque, final=fin)
+            posicion = 0
+            continue
+        
+        # El primer caracter define si la fuente es un arreglo JSON o una secuencia de registros (NDJSON)
+        if en_arreglo is None:
+            en_arreglo = buffer[posicion] == '['
+            if en_arreglo:
+                posicion += 1
+            continue
+        # Al cerrar el arreglo se sigue leyendo, la fuente puede tener más arreglos o registros (respuestas concatenadas)
+        if en_arreglo and buffer[posicion] == ']':
+            posicion += 1
+            en_arreglo = None
+            continue
+        
+        try:
+            registro, siguiente = decoder.raw_decode(buffer, posicion)
+        except json.JSONDecodeError:
+            # El registro está incompleto, se añade otro bloque al buffer y se vuelve a intentar
+            if fin:
+                raise
+            bloque = fuente.read(max(tamano_bloque, len(buffer) - posicion))
+            fin = not bloque
+            buffer = buffer[posicion:] + lector.decode(bloque, final=fin)
+            posicion = 0
+            continue
+        
+        posicion = siguiente
+        # Un arreglo dentro de un archivo NDJSON corresponde a una respuesta completa del API
+        if isinstance(registro, list):
+            yield from registro
+        else:
+            yield registro
+
+
+def iterar_registros_archivo(ruta_archivo: str, tamano_bloque: int = TAMANO_BLOQUE_LECTURA)-> Iterator[dict]:
+    """Función que recorre los registros de un archivo exportado del Sincronizador sin cargarlo completo en memoria
+
+    El archivo puede ser un arreglo JSON (tal como responde el API) o NDJSON (un registro por línea), opcionalmente
+    comprimido con gzip. El archivo se mapea en memoria y se decodifica por bloques de tamaño fijo, de modo que solo
+    se mantiene en memoria el bloque actual y el registro que se está leyendo.
+
+    Args:
+        ruta_archivo (str): Ruta al archivo exportado (.json, .ndjson, .jsonl o su versión .gz)
+        tamano_bloque (int): Número de bytes que se decodifican en cada lectura
+
+    Returns:
+        Iterator[dict]: Registros del archivo en el orden en que fueron exportados
+    """
+    with open(ruta_archivo, 'rb') as file:
+        # Un archivo vacío no se puede mapear en memoria y no tiene registros
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            # Si el archivo está comprimido se descomprime por bloques sobre el mapa de memoria
+            fuente = gzip.GzipFile(fileobj=mapa, mode='rb') if mapa[:2] == b'\x1f\x8b' else mapa
+            yield from _decodificar_registros(fuente, tamano_bloque)
+
+
+def iterar_registros_api(id_encuesta: str, header = Dict[str, str], tamano_bloque: int = TAMANO_BLOQUE_LECTURA, url_api: Optional[str] = None)-> Iterator[dict]:
+    """Función que recorre los registros del API a medida que se descargan, sin esperar la respuesta completa
+
+    Args:
+        id_encuesta (str): Id de la encuesta sobre la que se va a tomar la informacion
+        tamano_bloque (int): Número de bytes que se decodifican en cada lectura
+        url_api (Optional[str]): Dirección base del API, por defecto URL_API
+
+    Returns:
+        Iterator[dict]: Registros obtenidos desde el API
+    """
+    try:
+        response = solicitar_resultados(id_encuesta, header, url_api = url_api, stream = True)
+    except requests.exceptions.RequestException as req_ex:
+        print(f"Error en la solicitud: {req_ex}")
+        return
+    
+    with response:
+        # Se lee el contenido crudo para decodificarlo por bloques, descomprimiendo si el servidor usa gzip
+        response.raw.decode_content = True
+        yield from _decodificar_registros(response.raw, tamano_bloque)
+
+
+def agrupar_en_lotes(registros: Iterable[dict], tamano_lote: int = 1000)-> Iterator[List[dict]]:
+    """Función que agrupa una secuencia de registros en lotes de tamaño fijo
+
+    Args:
+        registros (Iterable[dict]): Registros a agrupar
+        tamano_lote (int): Número de registros (hogares) por lote
+
+    Returns:
+        Iterator[List[dict]]: Lotes de registros
+    """
+    lote = []
+    for registro in registros:
+        lote.append(registro)
+        if len(lote) >= tamano_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def valor_estrato(registro: dict, estrato: Optional[str]):
+    """Función que obtiene el valor de la variable de estratificación de un registro del Sincronizador
+
+    Args:
+        registro (dict): Registro (hogar) del Sincronizador
+        estrato (Optional[str]): Nombre de la variable, se busca en el registro y luego dentro de 'respuestas'
+
+    Returns:
+        Valor del estrato, None si no hay variable de estratificación o el registro no la tiene
+    """
+    if estrato is None:
+        return None
+    if estrato in registro:
+        return registro[estrato]
+    respuestas = registro.get('respuestas')
+    return respuestas.get(estrato) if isinstance(respuestas, dict) else None
+
+
+def muestrear_registros(registros: Iterable[dict], tamano_muestra: int, estrato: Optional[str] = None, semilla: Optional[int] = None)-> Tuple[List[dict], Dict]:
+    """Función que toma una muestra aleatoria estratificada de hogares en una sola pasada sobre los registros
+
+    En cada estrato se mantiene una muestra de reservorio de a lo sumo tamano_muestra registros. Al terminar, la muestra
+    se asigna a los estratos en proporción a su tamaño por el método del mayor residuo, de modo que los tamaños por estrato
+    suman exactamente tamano_muestra (o el número de registros si es menor), con al menos un hogar por estrato cuando el
+    tamaño de la muestra lo permite.
+
+    Args:
+        registros (Iterable[dict]): Registros (hogares) del Sincronizador
+        tamano_muestra (int): Número de hogares de la muestra
+        estrato (Optional[str]): Variable del hogar usada para estratificar, si es None la muestra es aleatoria simple
+        semilla (Optional[int]): Semilla del generador aleatorio
+
+    Returns:
+        Tuple[List[dict], Dict]: Registros de la muestra y diccionario con el número de estrato de cada registro ('estratos'),
+        el número de hogares en la población ('poblacion') y en la muestra ('muestra') por estrato y el valor de cada estrato ('valores')
+    """
+    generador = random.Random(semilla)
+    reservorios = {}
+    poblacion = {}
+    
+    for registro in registros:
+        valor = valor_estrato(registro, estrato)
+        # Las listas y diccionarios no se pueden usar como llave del estrato y los valores nulos se agrupan en un solo estrato
+        valor = valor if isinstance(valor, (str, int, float, bool, type(None))) else str(valor)
+        valor = None if pd.isna(valor) else valor
+        poblacion[valor] = poblacion.get(valor, 0) + 1
+        reservorio = reservorios.setdefault(valor, [])
+        if len(reservorio) < tamano_muestra:
+            reservorio.append(registro)
+        else:
+            j = generador.randrange(poblacion[valor])
+            if j < tamano_muestra:
+                reservorio[j] = registro
+    
+    # Asignación proporcional de la muestra a cada estrato por el método del mayor residuo: si alcanza, cada estrato recibe
+    # primero un hogar, luego la parte entera de su cuota del resto y los hogares que faltan van a los de mayor residuo
+    total = sum(poblacion.values())
+    objetivo = min(tamano_muestra, total)
+    minimo = 1 if objetivo >= len(reservorios) else 0
+    resto, capacidad = objetivo - minimo * len(reservorios), total - minimo * len(reservorios)
+    cuotas = {valor: divmod(resto * (poblacion[valor] - minimo), capacidad) if capacidad else (0, 0) for valor in reservorios}
+    asignados = {valor: minimo + cuotas[valor][0] for valor in reservorios}
+    faltantes = objetivo - sum(asignados.values())
+    for valor in sorted(reservorios, key = lambda valor: cuotas[valor][1], reverse = True)[:faltantes]:
+        asignados[valor] += 1
+    
+    # Los estratos se identifican con un número
+    muestra, estratos = [], []
+    tamanos = {'estratos': estratos, 'poblacion': {}, 'muestra': {}, 'valores': {}}
+    for numero, (valor, reservorio) in enumerate(reservorios.items()):
+        n = asignados[valor]
+        muestra.extend(generador.sample(reservorio, n))
+        estratos.extend([numero] * n)
+        tamanos['poblacion'][numero] = poblacion[valor]
+        tamanos['muestra'][numero] = n
+        tamanos['valores'][numero] = valor
+    
+    return muestra, tamanos
+
+
+def leer_lotes_archivo(ruta_archivo: str, tamano_lote: int = 1000)-> Iterator[List[dict]]:
+    """Función que agrupa los registros de un archivo exportado en lotes de tamaño fijo
+
+    Args:
+        ruta_archivo (str): Ruta al archivo exportado
+        tamano_lote (int): Número de registros (hogares) por lote
+
+    Returns:
+        Iterator[List[dict]]: Lotes de registros
+    """
+    return agrupar_en_lotes(iterar_registros_archivo(ruta_archivo), tamano_lote = tamano_lote)
+
+
+def read__dataframe_archivo(ruta_archivo: str)-> pd.DataFrame:
+    """Función que lee un archivo exportado del Sincronizador y lo convierte en un dataframe igual al obtenido desde el API
+
+    Args:
+        ruta_archivo (str): Ruta al archivo exportado
+
+    Returns:
+        pd.DataFrame: Dataframe resultante
+    """
+    try:
+        response = list(iterar_registros_archivo(ruta_archivo))
+    except (OSError, ValueError) as e:
+        print(f"Error al leer el archivo {ruta_archivo}: {e}")
+        return pd.DataFrame()
+    return normalizar_respuestas(response)
+
+
+def iter_dataframe_archivo(ruta_archivo: str, tamano_lote: int = 1000)-> Iterator[pd.DataFrame]:
+    """Función que lee un archivo exportado por lotes y devuelve cada lote como un dataframe normalizado
+
+    Args:
+        ruta_archivo (str): Ruta al archivo exportado
+        tamano_lote (int): Número de registros (hogares) por lote
+
+    Returns:
+        Iterator[pd.DataFrame]: Dataframes normalizados, uno por lote
+    """
+    for lote in leer_lotes_archivo(ruta_archivo, tamano_lote = tamano_lote):
+        yield normalizar_respuestas(lote)
     
     
     
@@ -136,13 +516,15 @@ def remove_datos_vacios_de_lista(row: pd.Series, col: str):
 
 
 
-def expand_data_frame(col: str, data: pd.DataFrame) -> pd.DataFrame:
+def expand_data_frame(col: str, data: pd.DataFrame, columnas: Optional[List] = None) -> pd.DataFrame:
     '''
     Expande una columna que contiene listas o diccionarios en un DataFrame.
 
     Args:
         col (str): Nombre de la columna a expandir.
         data (pd.DataFrame): DataFrame de entrada.
+        columnas (Optional[List]): Columnas que debe tener la expansión (ver esquema_expansion). Las que no aparecen en
+        los datos quedan vacías. Si es None se usan las columnas que resultan de los datos.
 
     Returns:
         pd.DataFrame: DataFrame expandido con las listas o diccionarios desglosados en filas separadas.
@@ -150,6 +532,8 @@ def expand_data_frame(col: str, data: pd.DataFrame) -> pd.DataFrame:
     # Se expande la columna como un dataframe y se guarda el index para poder concatenar más adelante
     expansion = pd.json_normalize(data[col].explode())
     relacion_filas = data[col].explode().index
+    if columnas is not None:
+        expansion = expansion.reindex(columns = columnas)
     
     # Si la expansión dió como resultado una única columna se deja el nombre original
     if len(list(expansion.columns)) == 1:
@@ -184,32 +568,110 @@ def expand_data_frame(col: str, data: pd.DataFrame) -> pd.DataFrame:
 
 
 
-def expandir_columnas_adicionales(dataframe: pd.DataFrame, malla: dict)-> pd.DataFrame:
+def expandir_columnas_adicionales(dataframe: pd.DataFrame, malla: dict, esquema: Optional[Dict[str, List]] = None)-> pd.DataFrame:
     """Función que tomas aquellas columnas que se deben expandir pero que no están entre Respuestas e Integrantes y las expande
 
     Args:
         data (pd.DataFrame): Dataframe Original
+        malla (dict): Malla de validación
+        esquema (Optional[Dict[str, List]]): Columnas a expandir y columnas de su expansión, calculadas sobre todos los
+        datos (ver esquema_expansion_lotes). Se usa al validar por lotes para que cada lote tenga las columnas de la
+        validación completa. Si es None las columnas a expandir se identifican en el dataframe
 
     Returns:
         pd.DataFrame: Dataframe Expandido
     """
-    
-    data = dataframe.copy()
-    
-    # Se identifican las variables que se pueden expandir
-    is_list = data.applymap(lambda x: isinstance(x, list)).any()
-    posible_expandir = list(is_list[is_list == True].index)
+    if esquema is not None:
+        return expandir_columnas(dataframe, list(esquema), esquema = esquema)
+    return expandir_columnas(dataframe, columnas_a_expandir(columnas_tipo_lista(dataframe), malla))
+
+
+def esquema_expansion(dataframe: pd.DataFrame, malla: dict)-> Dict[str, List]:
+    """Función que identifica las columnas que se deben expandir según la malla y las columnas que resultan de expandir cada una
+
+    Args:
+        dataframe (pd.DataFrame): Dataframe Original
+        malla (dict): Malla de validación
+
+    Returns:
+        Dict[str, List]: Columnas de la expansión de cada columna a expandir
+    """
+    return {columna: list(pd.json_normalize(dataframe[columna].explode()).columns) for columna in columnas_a_expandir(columnas_tipo_lista(dataframe), malla)}
+
+
+def esquema_expansion_lotes(lotes: Iterable[List[dict]], malla: dict)-> Dict[str, List]:
+    """Función que recorre los lotes de registros del Sincronizador y une el esquema de expansión de todos ellos
+
+    Un lote en el que una columna no tiene listas no la expande, por lo que las reglas de las columnas de su expansión no
+    se validarían. Con el esquema de todos los lotes (ver expandir_columnas_adicionales) cada lote tiene las mismas
+    columnas que la validación completa.
+
+    Args:
+        lotes (Iterable[List[dict]]): Lotes de registros (hogares)
+        malla (dict): Malla de validación
+
+    Returns:
+        Dict[str, List]: Columnas de la expansión de cada columna a expandir, en el orden en que aparecen en los lotes
+    """
+    esquema = {}
+    for lote in lotes:
+        for columna, columnas in esquema_expansion(normalizar_respuestas(lote), malla).items():
+            conocidas = esquema.setdefault(columna, [])
+            conocidas.extend(i for i in columnas if i not in conocidas)
+    return esquema
+
+
+def columnas_tipo_lista(dataframe: pd.DataFrame)-> List[str]:
+    """Función que identifica las columnas que tienen algún valor de tipo lista, es decir, las que se pueden expandir
+
+    Args:
+        dataframe (pd.DataFrame): Dataframe Original
+
+    Returns:
+        List[str]: Columnas con valores de tipo lista
+    """
+    is_list = dataframe.applymap(lambda x: isinstance(x, list)).any()
+    return list(is_list[is_list == True].index)
+
+
+def columnas_a_expandir(posible_expandir: List[str], malla: dict)-> List[str]:
+    """Función que selecciona, de las columnas que se pueden expandir, las que se deben expandir según la malla (las que no tienen valores)
+
+    Args:
+        posible_expandir (List[str]): Columnas con valores de tipo lista
+        malla (dict): Malla de validación
+
+    Returns:
+        List[str]: Columnas a expandir
+    """
     try:
-        # Se seleccionan las variables que se deben expandir según la malla
-        Expandir = [i for i in posible_expandir if malla[i]['valores'] is None]
+        return [i for i in posible_expandir if malla[i]['valores'] is None]
     except Exception as e:
         print("Error en la malla de validación")
         print(e)
+        return []
+
+
+def expandir_columnas(dataframe: pd.DataFrame, Expandir: List[str], esquema: Optional[Dict[str, List]] = None)-> pd.DataFrame:
+    """Función que expande las columnas indicadas y las concatena al dataframe
+
+    Args:
+        dataframe (pd.DataFrame): Dataframe Original
+        Expandir (List[str]): Columnas a expandir
+        esquema (Optional[Dict[str, List]]): Columnas de la expansión de cada columna (ver esquema_expansion). Si se
+        entrega, la expansión tiene siempre esas columnas, aunque el dataframe no tenga la columna o no tenga listas en ella
+
+    Returns:
+        pd.DataFrame: Dataframe Expandido
+    """
+    data = dataframe.copy()
         
     # Se expande cada columna seleccionada
     for columna in Expandir:
         try:
-            result = expand_data_frame(columna, data)
+            if esquema is not None and columna not in data.columns:
+                data[columna] = np.nan
+            result = expand_data_frame(columna, data, columnas = None if esquema is None else esquema[columna])
             # Si el resultado de la expansión da una única columna, se elimina la original y se mantiene la expandida
             if len(result.columns) == 1:
                 data = data.drop(columns = columna)
@@ -0,0 +1,322 @@
+import argparse
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Optional
+from urllib.parse import urlparse, parse_qs
+from validationgrid.read import cargar_malla_validacion
+
+
+# Textos de prueba para las variables validadas con expresión regular
+_TEXTOS_REGEX = ['3001234567', '6011234567', '2020-01-02', '12', 'correo@dominio.co', 'texto de prueba']
+
+
+def variables_integrante_malla(malla: dict)-> List[str]:
+    """Función que identifica las variables de la malla que se responden por integrante
+
+    En las mallas del Sincronizador las variables del integrante van seguidas, desde la nacionalidad o el tipo de documento
+    hasta el tipo de seguridad social o el final de la malla.
+
+    Args:
+        malla (dict): Malla de validación
+
+    Returns:
+        List[str]: Variables del integrante
+    """
+    variables = list(malla)
+    inicio = next((variables.index(i) for i in ['nacionalidad', 'tip_documento'] if i in variables), None)
+    if inicio is None:
+        return []
+    fin = variables.index('tip_seg_social') + 1 if 'tip_seg_social' in variables else len(variables)
+    return variables[inicio:fin]
+
+
+def _valor_sintetico(regla: dict, aleatorio: random.Random, probabilidad_error: float):
+    # Genera una respuesta que cumple la regla, salvo con probabilidad_error en la que queda vacía o fuera de los valores
+    valores = regla['valores']
+    if aleatorio.random() < probabilidad_error / 2:
+        return None
+    if valores is None:
+        return 'x'
+    tipo, permitidos = valores['Tipo'], valores['valor']
+    if tipo in ('int', 'str'):
+        return aleatorio.choice(permitidos) if aleatorio.random() >= probabilidad_error / 2 else 999
+    if tipo == 'regex':
+        return next((i for i in _TEXTOS_REGEX if re.match(permitidos, i)), 'x')
+    if tipo == 'list':
+        return aleatorio.sample(permitidos, min(2, len(permitidos)))
+    if tipo == 'listlist':
+        return [aleatorio.sample(permitidos, min(2, len(permitidos)))]
+    return 1
+
+
+def _asignar(destino: dict, variable: str, valor):
+    # Las variables con puntos se guardan anidadas, como las entrega el Sincronizador
+    partes = variable.split('.')
+    for parte in partes[:-1]:
+        destino = destino.setdefault(parte, {})
+        if not isinstance(destino, dict):
+            return
+    destino[partes[-1]] = valor
+
+
+def generar_registros(malla: dict, hogares: int, integrantes_max: int = 6, probabilidad_error: float = 0.004, semilla: int = 0)-> List[dict]:
+    """Función que genera registros sintéticos con la estructura del Sincronizador a partir de la malla de validación
+
+    Args:
+        malla (dict): Malla de validación
+        hogares (int): Número de hogares
+        integrantes_max (int): Número máximo de integrantes por hogar
+        probabilidad_error (float): Probabilidad de que una respuesta quede vacía o fuera de los valores permitidos
+        semilla (int): Semilla para generar siempre los mismos registros
+
+    Returns:
+        List[dict]: Registros de la encuesta
+    """
+    aleatorio = random.Random(semilla)
+    integrante = variables_integrante_malla(malla)
+    variables_hogar = [i for i in malla if i not in integrante and i != 'id']
+    registros = []
+    for id_hogar in range(hogares):
+        respuestas = {}
+        for variable in variables_hogar:
+            _asignar(respuestas, variable, _valor_sintetico(malla[variable], aleatorio, probabilidad_error))
+        respuestas['integrante'] = []
+        for i in range(aleatorio.randint(1, integrantes_max)):
+            respuesta_integrante = {}
+            for variable in integrante:
+                _asignar(respuesta_integrante, variable, _valor_sintetico(malla[variable], aleatorio, probabilidad_error))
+            respuesta_integrante['num_documento'] = str(aleatorio.randint(1, 10 ** 9))
+            respuesta_integrante['Edad'] = aleatorio.randint(0, 90)
+            respuesta_integrante['identificacion'] = i
+            respuestas['integrante'].append(respuesta_integrante)
+        respuestas['NUMERODOCUMENTOTITULAR'] = respuestas['integrante'][0]['num_documento']
+        registros.append({'id': id_hogar, 'respuestas': respuestas})
+    return registros
+
+
+class ServidorSincronizador:
+    """Servidor HTTP local que imita el API del Sincronizador para pruebas de carga
+
+    Atiende GET /api/Sincronizador/resultados?id=<id_encuesta> con registros sintéticos generados a partir de la malla de la
+    encuesta, guardados en memoria la primera vez que se solicitan. Cada solicitud puede esperar una latencia antes de
+    responder, limitar la velocidad de envío, enviar la respuesta por partes (chunked), responder 429 con Retry-After,
+    responder con error o cortar la conexión a mitad de la respuesta.
+
+    Args:
+        ruta (str): Ruta al folder donde esta el proyecto, de donde se leen las mallas
+        hogares (int): Número de hogares por encuesta
+        integrantes_max (int): Número máximo de integrantes por hogar
+        latencia (float): Segundos de espera antes de responder
+        bytes_por_segundo (Optional[int]): Velocidad máxima de envío, None para no limitarla
+        por_partes (bool): Si es True, la respuesta se envía con Transfer-Encoding: chunked en lugar de Content-Length
+        tamano_parte (int): Número de bytes de cada envío
+        comprimir (bool): Si es True y el cliente lo acepta, la respuesta se envía comprimida con gzip
+        probabilidad_429 (float): Probabilidad de responder 429 (demasiadas solicitudes)
+        retry_after (float): Segundos indicados en el encabezado Retry-After de las respuestas 429
+        probabilidad_error (float): Probabilidad de responder con codigo_error
+        codigo_error (int): Código de las respuestas con error
+        probabilidad_corte (float): Probabilidad de cortar la conexión a mitad de la respuesta
+        token (Optional[str]): Si se entrega, las solicitudes sin "Bearer <token>" reciben 401
+        semilla (int): Semilla de los registros y de las fallas
+        host (str): Dirección donde escucha el servidor
+        puerto (int): Puerto donde escucha el servidor, 0 para usar uno libre
+    """
+
+    RUTA = '/api/Sincronizador/resultados'
+
+    def __init__(self, ruta: str, hogares: int = 1000, integrantes_max: int = 6, latencia: float = 0.0, bytes_por_segundo: Optional[int] = None,
+                 por_partes: bool = True, tamano_parte: int = 1 << 16, comprimir: bool = False, probabilidad_429: float = 0.0, retry_after: float = 1.0,
+                 probabilidad_error: float = 0.0, codigo_error: int = 500, probabilidad_corte: float = 0.0, token: Optional[str] = None,
+                 semilla: int = 0, host: str = '127.0.0.1', puerto: int = 0):
+        self.ruta = ruta
+        self.hogares = hogares
+        self.integrantes_max = integrantes_max
+        self.latencia = latencia
+        self.bytes_por_segundo = bytes_por_segundo
+        self.por_partes = por_partes
+        self.tamano_parte = tamano_parte
+        self.comprimir = comprimir
+        self.probabilidad_429 = probabilidad_429
+        self.retry_after = retry_after
+        self.probabilidad_error = probabilidad_error
+        self.codigo_error = codigo_error
+        self.probabilidad_corte = probabilidad_corte
+        self.token = token
+        self.semilla = semilla
+        self._aleatorio = random.Random(semilla)
+        self._contenidos = {}
+        self._lock = threading.Lock()
+        self._conteo = {}
+        self._servidor = ThreadingHTTPServer((host, puerto), self._manejador())
+        self._servidor.daemon_threads = True
+        self._hilo = None
+
+    @property
+    def url(self)-> str:
+        """Dirección base del servidor, para usar como url_api"""
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def contenido(self, id_encuesta: str)-> bytes:
+        """Devuelve el cuerpo JSON de la encuesta, generándolo la primera vez.
+
+        Args:
+            id_encuesta (str): Id de la encuesta
+
+        Returns:
+            bytes: Registros de la encuesta en formato JSON
+        """
+        with self._lock:
+            if id_encuesta not in self._contenidos:
+                malla = cargar_malla_validacion(id_encuesta, ruta_folder = self.ruta)
+                registros = generar_registros(malla, self.hogares, integrantes_max = self.integrantes_max, semilla = self.semilla)
+                self._contenidos[id_encuesta] = json.dumps(registros, ensure_ascii = False).encode('utf-8')
+            return self._contenidos[id_encuesta]
+
+    def estadisticas(self)-> Dict[int, int]:
+        """Devuelve el número de respuestas enviadas por código de estado (0 para las conexiones cortadas).
+
+        Returns:
+            Dict[int, int]: Número de respuestas por código
+        """
+        with self._lock:
+            return dict(self._conteo)
+
+    def _registrar(self, codigo: int):
+        with self._lock:
+            self._conteo[codigo] = self._conteo.get(codigo, 0) + 1
+
+    def _sortear(self, probabilidad: float)-> bool:
+        with self._lock:
+            return self._aleatorio.random() < probabilidad
+
+    def _manejador(self):
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, formato, *args):
+                pass
+
+            def _responder_error(self, codigo: int, mensaje: str, encabezados: Optional[Dict[str, str]] = None):
+                cuerpo = json.dumps({'mensaje': mensaje}).encode('utf-8')
+                self.send_response(codigo)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                for nombre, valor in (encabezados or {}).items():
+                    self.send_header(nombre, valor)
+                self.end_headers()
+                self.wfile.write(cuerpo)
+                servidor._registrar(codigo)
+
+            def _enviar(self, datos: bytes):
+                # Se limita la velocidad esperando el tiempo que tomaría enviar los datos a bytes_por_segundo
+                if servidor.bytes_por_segundo:
+                    time.sleep(len(datos) / servidor.bytes_por_segundo)
+                if servidor.por_partes:
+                    self.wfile.write(b'%x\r\n' % len(datos) + datos + b'\r\n')
+                else:
+                    self.wfile.write(datos)
+
+            def do_GET(self):
+                solicitud = urlparse(self.path)
+                if solicitud.path != servidor.RUTA:
+                    return self._responder_error(404, 'Ruta no encontrada')
+                if servidor.token is not None and self.headers.get('Authorization') != f"Bearer {servidor.token}":
+                    return self._responder_error(401, 'Token no válido')
+                if servidor.latencia:
+                    time.sleep(servidor.latencia)
+                if servidor._sortear(servidor.probabilidad_429):
+                    return self._responder_error(429, 'Demasiadas solicitudes', {'Retry-After': str(servidor.retry_after)})
+                if servidor._sortear(servidor.probabilidad_error):
+                    return self._responder_error(servidor.codigo_error, 'Error de prueba')
+
+                id_encuesta = parse_qs(solicitud.query).get('id', [''])[0]
+                try:
+                    cuerpo = servidor.contenido(id_encuesta)
+                except (ValueError, OSError):
+                    return self._responder_error(404, f'Encuesta {id_encuesta} no encontrada')
+                comprimir = servidor.comprimir and 'gzip' in self.headers.get('Accept-Encoding', '')
+                if comprimir:
+                    cuerpo = gzip.compress(cuerpo, compresslevel = 1)
+                corte = len(cuerpo) // 2 if servidor._sortear(servidor.probabilidad_corte) else None
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                if comprimir:
+                    self.send_header('Content-Encoding', 'gzip')
+                if servidor.por_partes:
+                    self.send_header('Transfer-Encoding', 'chunked')
+                else:
+                    self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+
+                for inicio in range(0, len(cuerpo), servidor.tamano_parte):
+                    if corte is not None and inicio >= corte:
+                        # Se corta la conexión sin terminar la respuesta
+                        servidor._registrar(0)
+                        self.close_connection = True
+                        return
+                    self._enviar(cuerpo[inicio:inicio + servidor.tamano_parte])
+                if servidor.por_partes:
+                    self.wfile.write(b'0\r\n\r\n')
+                servidor._registrar(200)
+
+        return Manejador
+
+    def iniciar(self)-> str:
+        """Inicia el servidor en un hilo.
+
+        Returns:
+            str: Dirección base del servidor
+        """
+        self._hilo = threading.Thread(target = self._servidor.serve_forever, name = 'servidor-sincronizador', daemon = True)
+        self._hilo.start()
+        return self.url
+
+    def detener(self):
+        """Detiene el servidor y libera el puerto."""
+        self._servidor.shutdown()
+        self._servidor.server_close()
+        if self._hilo is not None:
+            self._hilo.join()
+
+    def __enter__(self):
+        self.iniciar()
+        return self
+
+    def __exit__(self, *args):
+        self.detener()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Servidor local que imita el API del Sincronizador con datos sintéticos')
+    parser.add_argument('--ruta', default = '.', help = 'Ruta al folder del proyecto, donde está data/json')
+    parser.add_argument('--puerto', type = int, default = 8000)
+    parser.add_argument('--hogares', type = int, default = 1000)
+    parser.add_argument('--latencia', type = float, default = 0.0)
+    parser.add_argument('--bytes-por-segundo', type = int, default = None)
+    parser.add_argument('--sin-partes', action = 'store_true', help = 'Enviar con Content-Length en lugar de chunked')
+    parser.add_argument('--comprimir', action = 'store_true')
+    parser.add_argument('--probabilidad-429', type = float, default = 0.0)
+    parser.add_argument('--probabilidad-error', type = float, default = 0.0)
+    parser.add_argument('--probabilidad-corte', type = float, default = 0.0)
+    argumentos = parser.parse_args()
+
+    servidor = ServidorSincronizador(argumentos.ruta, hogares = argumentos.hogares, latencia = argumentos.latencia,
+                                     bytes_por_segundo = argumentos.bytes_por_segundo, por_partes = not argumentos.sin_partes,
+                                     comprimir = argumentos.comprimir, probabilidad_429 = argumentos.probabilidad_429,
+                                     probabilidad_error = argumentos.probabilidad_error, probabilidad_corte = argumentos.probabilidad_corte,
+                                     puerto = argumentos.puerto)
+    print(f"Servidor del Sincronizador de prueba en {servidor.url}")
+    print(f"Use url_api='{servidor.url}' o la variable de entorno URL_API_SINCRONIZADOR")
+    try:
+        servidor._servidor.serve_forever()
+    except KeyboardInterrupt:
+        servidor._servidor.server_close()
@@ -1,12 +1,36 @@
 import pandas as pd
 import numpy as np
-from typing import List, Union, Optional, Dict, Tuple
+from typing import List, Union, Optional, Dict, Tuple, Iterable
+from statistics import NormalDist
 import warnings
+import json
+from validationgrid.expresion import evaluar_expresion, traducir_condicion, columnas_expresion, unir_condiciones
 #from pandas.core.common import SettingWithCopyWarning
 
 warnings.simplefilter(action='ignore', category=pd.errors.PerformanceWarning)
 #warnings.simplefilter(action='ignore', category=SettingWithCopyWarning)
 
+# Variables de la verificación general (Participar, Tierra y Agua)
+COLUMNAS_PTA = ['DESEAPARTICIPAR', 'HOGAR_DISPONE_TIERRA', 'HOGAR_DISPONE_AGUA']
+
+# Estimación de la memoria de trabajo por fila de la validación (ver filas_por_bloque). Los valores se midieron con
+# tracemalloc sobre malla_validacion con la malla 212 y exportados de 1 033 y 10 537 filas, dividiendo por el número de filas.
+# Cada columna convertida a entero queda como Int64 (8 bytes del valor y 1 de la máscara, se midieron 9) y durante la
+# conversión existe además el float intermedio (8)
+BYTES_COLUMNA_ENTERA = 17
+# Arreglos temporales de la regla que se está validando: el pico de la regla más costosa (expresión regular con condición)
+# fue de 62 a 81 bytes y el de la conversión a entero de una columna de texto de 65 a 69 bytes. Se deja un margen de más
+# del doble para mallas con condiciones más largas
+BYTES_TEMPORALES_FILA = 256
+
+# Bytes por fila del resultado además de un byte por variable validada: Validacion (8), Documento_Duplicado y la marca de
+# duplicado (2) y las tres variables de identificación convertidas a entero (27). Es el caso más costoso, con los
+# documentos como texto las columnas de identificación ocupan 8 bytes y se midieron 35 bytes
+BYTES_SALIDA_FILA = 37
+
+# Con bloques de menos filas el costo fijo de cada regla domina y la validación por bloques es lenta
+FILAS_MINIMAS_BLOQUE = 1000
+
 
 
 # Función para dejar las condiciones que recibe del Excel de validación en las condiciones como lista de valores o cómo valores únicos según el tipo de dato
@@ -32,6 +56,9 @@ def get_list_condiciones(row:pd.Series):
         # Si el tipo de dato es entero, devuelve la lista de valores en formato entero
         if B == 'int':
             val = [int(i) for i in A.split("|")]
+        # Si la condición es una expresión, devuelve la expresión como cadena
+        elif B == 'expr':
+            val = A
         # Para cualquier otro caso devuelve los datos cómo tipo lista de cadenas de texto
         else:
             val = [str(i) for i in A.split("|")]
@@ -67,7 +94,7 @@ def get_list_valores(row: pd.Series):
         # En el caso que sea de tipo string o listas devuelva la lista de de cadenas de texto
         elif B == 'str' or B=='list' or B == 'listlist':
             val = [str(i) for i in A.split("|")]
-        # Los demas casos (TIPO REGEX) devuelva solo la cadena
+        # Los demas casos (TIPO REGEX y EXPR) devuelva solo la cadena
         else:
             val = A
     return val
@@ -122,8 +149,9 @@ def create_malla_dict(condiciones: pd.DataFrame, valores: pd.DataFrame)-> Dict[s
         guarda en el diccionario de la variable el diccionario con la variable de la que depende y la condición o valor que debe tomar para 
         que se active la pregunta (Dado que una variable puede tener una o más condiciones, en el caso que tenga más de una condición, esta condición
         se va a añadir en el diccionario de la variable)
+        Si el tipo de validación es expr, la condición es una expresión (ver validationgrid/expresion.py) y se guarda como cadena.
         - valores: Ingresa los valores que debe tomar la variable, si no hay valores por validar, devuelve None, caso contrario crea un diccionario donde
-        almacena los valores que puede tomar y el tipo de validación que se va a realizar (int, str, regex, list, listlist)
+        almacena los valores que puede tomar y el tipo de validación que se va a realizar (int, str, regex, list, listlist, expr)
         - iand: Se refiere a la pregunta de si las multiples condiciones a validar son de tipo or o de tipo and, si está vacío significa que es de tipo or por lo que
         devuelve Falso, caso contrario devuelve True.
         - opcional: Se refiere al caso de si la pregunta es opcional, si no es opcional devuelve True, caso contrario devuelve False
@@ -131,13 +159,19 @@ def create_malla_dict(condiciones: pd.DataFrame, valores: pd.DataFrame)-> Dict[s
         caso contrario devuelve False
         """
     
+        # Las condiciones de tipo expresión se guardan como cadena, las demás como diccionario de la variable de la que depende
+        if row['tipo_validacion'] == 'expr':
+            condicion_variable = condicion
+        else:
+            condicion_variable = None if pd.isna(dependiente) else {dependiente : condicion}
+    
         # Si la variable ya tiene una condición se añade la nueva condición
         if variable in malla.keys():
-            malla[variable]['condicion'].update({dependiente : condicion})
+            malla[variable]['condicion'] = unir_condiciones(malla[variable]['condicion'], condicion_variable, malla[variable]['iand'])
         # Creación del diccionario según los parámetros
         else:
             malla[variable] = {
-                'condicion': None if pd.isna(dependiente) else {dependiente : condicion},
+                'condicion': condicion_variable,
                 'valores': None if pd.isna(condicion_valor) else {'valor':valor, 'Tipo': condicion_valor},
                 'iand': False if pd.isna(iand) else True,
                 'opcional': False if pd.isna(opcional) else True,
@@ -148,33 +182,35 @@ def create_malla_dict(condiciones: pd.DataFrame, valores: pd.DataFrame)-> Dict[s
 
 
 # Crear las condiciones para cada variable o pregunta
-def crear_condicion(diccionario: Optional[Dict], data: pd.DataFrame, iand: bool = False,  excluye_pta: bool = False) -> Optional[pd.Series]:
+def crear_condicion(diccionario: Optional[Union[Dict, str]], data: pd.DataFrame, iand: bool = False,  excluye_pta: bool = False) -> Optional[pd.Series]:
     '''
-    Crea las condiciones para cada variable o pregunta según un diccionario y los datos proporcionados.
+    Crea las condiciones para cada variable o pregunta según un diccionario o una expresión y los datos proporcionados.
+
+    Las condiciones en formato de diccionario se traducen a una expresión (ver traducir_condicion) y todas las
+    condiciones se evalúan con evaluar_expresion. De una condición en diccionario solo se aplica la primera variable.
 
     Args:
-        diccionario (Dict): Un diccionario que especifica las condiciones para cada variable.
+        diccionario (Optional[Union[Dict, str]]): Un diccionario que especifica las condiciones para cada variable o una expresión.
         data (pd.DataFrame): El DataFrame de datos que se utilizará para verificar las condiciones.
-        iand (bool): Indica si se deben combinar las condiciones con una operación AND (True) o OR (False). Por defecto, es False.
+        iand (bool): Indica si se deben combinar las condiciones del diccionario con una operación AND (True) o OR (False). Por defecto, es False.
         excluye_pta (bool): Indica si se debe excluir de la validación general (Participar, Tierra y Agua). Por defecto, es False.
 
     Returns:
         Optional[pd.Series]: Una Serie booleana que representa las condiciones resultantes. Si el diccionario es None y general es False, se devuelve None.
     '''
-    # Se define el espacio donde se va a guardar la condición
-    condicion_total = None
-    
     # Se definen las variables de la verificación general
     # Se crea el filtro dependiendo si las variables se encuentran en el dataframe
-    columnas_a_verificar = ['DESEAPARTICIPAR', 'HOGAR_DISPONE_TIERRA', 'HOGAR_DISPONE_AGUA']
     filtros = []
-    for columna in columnas_a_verificar:
+    for columna in COLUMNAS_PTA:
         if columna in data.columns:
             filtro = data[columna] == ('SI' if columna == 'DESEAPARTICIPAR' else True)
             filtros.append(filtro)
     
     if filtros:
-        condicion_general = all(filtros)
+        # Se combinan los filtros elemento a elemento (todas las condiciones generales se deben cumplir)
+        condicion_general = filtros[0]
+        for filtro in filtros[1:]:
+            condicion_general = condicion_general & filtro
     else:
         condicion_general = None
     
@@ -186,37 +222,55 @@ def crear_condicion(diccionario: Optional[Dict], data: pd.DataFrame, iand: bool
         # Si no hay condición ni requiere condición general devuelve None
         else:
             return None
-    # Si en el diccionario si hay al menos una condición se dispone a crear la condición
+    # Si hay condición se evalúa como expresión, las condiciones en diccionario se traducen primero
     else:
-        # Se itera sobre todas las condiciones existentes en el diccionario
-        for col, valores in diccionario.items():
-            # En el caso que la condición provenga de la variable Edad no se verifican valores de una lista sino que la Edad sea mayor a la establecida por la condición
-            if 'Edad' in col:
-                try:
-                    condicion_col = data[col] > valores[0]
-                except KeyError as e:
-                    raise ValueError(f"Error al acceder a la columna '{col}' en el DataFrame de datos") from e
-            else: 
-                # En el caso que no sea Edad se verifica que el valor se encuentre en la lista específicada
-                try:
-                    condicion_col = data[col].isin(valores)
-                except KeyError as e:
-                    raise ValueError(f"Error al acceder a la columna '{col}' en el DataFrame de datos") from e
-            # Se almacena la condición creada en el valor condicion_Total
-            
-            # Si no hay más condiciones la guarda, si hay más condiciones las combina según el tipo de validacion (OR, AND)
-            if condicion_total is None:
-                condicion_total = condicion_col
-            else:
-                if iand:
-                    condicion_total = condicion_total & condicion_col
-                else:
-                    condicion_total = condicion_total | condicion_col
-            if excluye_pta == False:
-                return condicion_total & condicion_general
-            else:
-                return condicion_total
-            
+        if isinstance(diccionario, str):
+            expresion = diccionario
+        else:
+            # En formato de diccionario se conserva el resultado histórico: solo se aplica la condición de la primera variable
+            expresion = traducir_condicion(dict(list(diccionario.items())[:1]), iand)
+        condicion_total = evaluar_expresion(expresion, data)
+        if excluye_pta == False and condicion_general is not None:
+            return condicion_total & condicion_general
+        else:
+            return condicion_total
+
+
+# Función que lista las variables de las que depende la condición de una variable
+def columnas_condicion(diccionario: Optional[Union[Dict, str]]) -> List[str]:
+    '''
+    Lista las variables que usa una condición de la malla.
+
+    Args:
+        diccionario (Optional[Union[Dict, str]]): Condición en formato de diccionario o de expresión.
+
+    Returns:
+        List[str]: Variables de la condición.
+    '''
+    if diccionario is None:
+        return []
+    if isinstance(diccionario, str):
+        return columnas_expresion(diccionario)
+    return list(diccionario.keys())
+
+
+# Función que lista las variables que usa la validación de una variable
+def dependencias_regla(col: str, guia_validacion: dict) -> List[str]:
+    '''
+    Lista la variable y las variables que usan su condición y sus valores de tipo expresión, sin la verificación general.
+
+    Args:
+        col (str): Variable de la regla.
+        guia_validacion (dict): Malla de validación.
+
+    Returns:
+        List[str]: Variables de la regla sin repetidos, empezando por col.
+    '''
+    dependencias = [col] + columnas_condicion(guia_validacion[col]['condicion'])
+    valores = guia_validacion[col]['valores']
+    if valores is not None and valores['Tipo'] == 'expr':
+        dependencias += columnas_expresion(valores['valor'])
+    return list(dict.fromkeys(dependencias))
             
             
 # Función para retornar verdadero o falso si la validación es de lista
@@ -232,10 +286,24 @@ def todos_en_valores_permitidos(row: pd.Series, lista: List, col: str) -> bool:
     Returns:
         bool: True si todos los valores en la lista están permitidos en la columna, False en caso contrario.
     '''
+    return todos_en_lista(row[col], lista)
+
+
+def todos_en_lista(valores, lista: List) -> bool:
+    '''
+    Verifica si todos los valores de una respuesta de opción multiple están en la lista de valores permitidos.
+
+    Args:
+        valores: Respuesta de la variable (lista de valores).
+        lista (List): Lista de valores permitidos.
+
+    Returns:
+        bool: True si todos los valores están permitidos, False en caso contrario.
+    '''
     # Intenta verificar que los valores estén en la lista
     # En el caso que el dato se encuentre vacío y no pueda iterar entonces el valor está erroneo y devuelve False
     try:
-        return all(valor in lista for valor in row[col])
+        return all(valor in lista for valor in valores)
     except:
         return False
     
@@ -255,9 +323,23 @@ def validar_listlist(row: pd.Series, lista: List, col: str) -> bool:
     Returns:
         bool: True si todos los valores en la lista están permitidos en la columna, False en caso contrario.
     '''
+    return todas_las_listas_en_lista(row[col], lista)
+
+
+def todas_las_listas_en_lista(valores, lista: List) -> bool:
+    '''
+    Verifica si todos los valores de cada lista de una respuesta de tipo lista de listas están en la lista de valores permitidos.
+
+    Args:
+        valores: Respuesta de la variable (lista de listas de valores).
+        lista (List): Lista de valores permitidos.
+
+    Returns:
+        bool: True si todos los valores están permitidos, False en caso contrario.
+    '''
     # En todas las listas, los valores de cada lista se encuentran dentro de los valores permitidos
     try:
-        return all(all(valor in lista for valor in list) for list in row[col]) 
+        return all(all(valor in lista for valor in list) for list in valores) 
     except:
         return False
     
@@ -285,52 +367,91 @@ def verificar_valores(diccionario: Optional[Dict], data: pd.DataFrame, col: str)
         tipo = diccionario['Tipo']
         if tipo == 'regex':
             condicion = data[col].astype(str).str.match(valores)
+        elif tipo == 'expr':
+            condicion = evaluar_expresion(valores, data, valor = data[col])
+        # Las listas se revisan sobre la columna, sin recorrer las filas completas del DataFrame
         elif tipo == 'listlist':
-            condicion = data.apply(validar_listlist, args = (valores, col), axis = 1)
+            condicion = data[col].apply(todas_las_listas_en_lista, args = (valores,))
         elif tipo == 'list':
-            condicion = data.apply(todos_en_valores_permitidos, args = (valores, col), axis = 1)
+            condicion = data[col].apply(todos_en_lista, args = (valores,))
+        elif isinstance(data[col].dtype, pd.CategoricalDtype):
+            condicion = codigos_permitidos(data[col], valores)
         else:
             condicion = data[col].isin(valores)
         
     return condicion
 
 
+# Función para verificar valores permitidos sobre una columna categórica usando los códigos en lugar de los valores
+def codigos_permitidos(serie: pd.Series, valores: List) -> pd.Series:
+    '''
+    Verifica si los valores de una columna categórica están entre los valores permitidos.
+
+    Si la columna fue creada por categorizar_valores, los primeros códigos corresponden a los valores permitidos y la
+    verificación se reduce a comparar el código con el número de valores permitidos. En otro caso se usa isin.
+
+    Args:
+        serie (pd.Series): Columna de tipo categórico.
+        valores (List): Lista de valores permitidos.
+
+    Returns:
+        pd.Series: Serie booleana, True si el valor está permitido.
+    '''
+    permitidos = indice_valores_permitidos(valores)
+    n_permitidos = len(permitidos)
+    # Se comparan los valores de las categorías, cortar el índice de categorías deja una referencia en pandas en cada bloque validado
+    categorias = pd.Index(serie.cat.categories.to_numpy()[:n_permitidos], dtype = object)
+    if not categorias.equals(permitidos):
+        return serie.isin(valores)
+    codigos = serie.cat.codes.to_numpy()
+    return pd.Series((codigos >= 0) & (codigos < n_permitidos), index = serie.index)
+
+
+def indice_valores_permitidos(valores: List) -> pd.Index:
+    '''
+    Crea el índice de valores permitidos sin repetidos y en el orden de la malla.
+
+    Args:
+        valores (List): Lista de valores permitidos.
+
+    Returns:
+        pd.Index: Índice de valores permitidos.
+    '''
+    return pd.Index(pd.unique(pd.Series(valores, dtype = object)).tolist())
+
+
 # Función que entra a revisar las condiciones y valores de cada variable
-def validar_valor(condicion: Optional[pd.Series], values: Optional[pd.Series], col: str, data: pd.DataFrame, file: pd.DataFrame) -> pd.Series:
+def validar_valor(condicion: Optional[pd.Series], values: Optional[pd.Series], col: str, data: pd.DataFrame, file: Optional[pd.DataFrame] = None) -> pd.Series:
     '''
     Valida los valores en la columna de datos según las condiciones y los valores a tomar.
 
+    Un registro tiene error (1) si cumple la condición y su valor está vacío o no está entre los valores permitidos, en
+    otro caso está correcto (0). Solo se leen la columna y las series de condición y valores, sin filtrar el DataFrame.
+
     Args:
         condicion (Optional[pd.Series]): Serie booleana que representa las condiciones de validación.
         values (Optional[pd.Series]): Serie booleana que especifica los valores a tomar.
         col (str): Nombre de la columna en la que se valida.
         data (pd.DataFrame): DataFrame de datos original.
-        file (pd.DataFrame): DataFrame en el que se actualizan los resultados.
+        file (Optional[pd.DataFrame]): DataFrame en el que se guarda el resultado en la columna col, si se entrega.
 
     Returns:
-        pd.Series: Serie actualizada con los valores validados.
+        pd.Series: Serie con 0 si el valor está correcto y 1 si está erroneo.
     '''
     try:
-        # En la columna se guardan valores de tipo 0, es decír inicialmente todos los datos están correctos
-        file[col] = 0
-        
-        # Realiza la verificación de la condición o pasa en el caso que no haya condición
-        if condicion is None:
-            val_data = data
-        else:
-            val_data = data[condicion]
-        
-        # Revisa los valores en la variable en el dataframe condicionado por la condición
         # Va a retornar 0 si el valor está correcto y 1 si el valor está erroneo
-        if values is None:
-            val_series = val_data[col].isnull().astype(int)
-        else:
-            val_series = val_data.where(values)[col].isnull().astype(int)
-            
-        # Se actualiza la columna con valores 0, con 1 en los indices donde el dato está erroneo.
-        file[col].update(val_series)
+        errores = data[col].isna().to_numpy()
+        if values is not None:
+            errores = errores | ~np.asarray(values.to_numpy(dtype = bool, na_value = False))
+        
+        # Los registros que no cumplen la condición no se revisan
+        if condicion is not None:
+            errores = errores & condicion.to_numpy(dtype = bool, na_value = False)
         
-        return file[col]
+        resultado = pd.Series(errores.astype(np.int8), index = data.index)
+        if file is not None:
+            file[col] = resultado
+        return resultado
     except Exception as e:
         # Manejo de excepciones para identificar y manejar errores específicos
         raise ValueError(f"Error al validar valores en la columna '{col}'") from e
@@ -349,80 +470,464 @@ def restore_type(data: pd.DataFrame, numeric: List[str] or Tuple[str]) -> pd.Dat
         pd.DataFrame: DataFrame con las variables numéricas convertidas a tipo entero si es posible.
     '''
     
+    for col, serie in tipos_restaurados(data, numeric).items():
+        data[col] = serie
+    return data
+
+
+def tipos_restaurados(data: pd.DataFrame, numeric: List[str] or Tuple[str]) -> Dict[str, pd.Series]:
+    '''
+    Convierte a tipo entero las variables numéricas sin modificar el DataFrame.
+
+    Args:
+        data (pd.DataFrame): DataFrame de datos.
+        numeric (List[str] or Tuple[str]): Lista o tupla de nombres de columnas numéricas.
+
+    Returns:
+        Dict[str, pd.Series]: Columnas convertidas a tipo entero.
+    '''
     # Se hace la unión de los valores que el dataframe identifica como numéricas más aquellas que el usuario determina como numéricas
     num_cols = list(set(list(data.select_dtypes(include=np.number).columns))|set(numeric))
     
     # En el caso que la variable no sea latitud o longitud, se convierte el valor de la columna como entero
-    for col in num_cols:
-        if col not in ['latitud', 'longitud']:
-            try:
-                data[col]= data[col].astype('float').astype('Int64')
-            except:
-                data[col] = np.floor(pd.to_numeric(data[col], errors='coerce')).astype('Int64')
+    return {col: serie_entera(data[col]) for col in num_cols if es_restaurable(col, data[col])}
+
+
+def es_restaurable(col: str, serie: pd.Series) -> bool:
+    '''
+    Indica si restore_type convierte la columna a entero, es decir, si no es latitud o longitud ni es categórica.
+
+    Args:
+        col (str): Nombre de la columna.
+        serie (pd.Series): Columna.
+
+    Returns:
+        bool: True si la columna se puede convertir.
+    '''
+    # Las columnas categóricas ya fueron convertidas en categorizar_valores
+    return col not in ['latitud', 'longitud'] and not isinstance(serie.dtype, pd.CategoricalDtype)
+
+
+def serie_entera(serie: pd.Series) -> pd.Series:
+    '''
+    Convierte una columna a tipo entero, los valores no numéricos quedan vacíos.
+
+    Args:
+        serie (pd.Series): Columna.
+
+    Returns:
+        pd.Series: Columna de tipo Int64.
+    '''
+    try:
+        return serie.astype('float').astype('Int64')
+    except:
+        return np.floor(pd.to_numeric(serie, errors='coerce')).astype('Int64')
+
+
+# Función para tomar las columnas de la validación sin copiar los datos
+def vista_columnas(data: pd.DataFrame, columnas: List[str], numeric: List[str] or Tuple[str]) -> pd.DataFrame:
+    '''
+    Crea un DataFrame con las columnas indicadas que comparte los datos con data, con las variables numéricas convertidas a
+    entero como en restore_type. Solo las columnas convertidas ocupan memoria nueva y data no se modifica.
+
+    Args:
+        data (pd.DataFrame): DataFrame de datos.
+        columnas (List[str]): Columnas a tomar.
+        numeric (List[str] or Tuple[str]): Columnas que la malla define como numéricas.
+
+    Returns:
+        pd.DataFrame: DataFrame con las columnas indicadas.
+    '''
+    vista = {col: data[col] for col in columnas}
+    
+    # Las mismas columnas que convierte restore_type: las numéricas y las que la malla define como numéricas
+    for col, serie in vista.items():
+        numerica = pd.api.types.is_numeric_dtype(serie.dtype) and not pd.api.types.is_bool_dtype(serie.dtype)
+        if (numerica or col in numeric) and es_restaurable(col, serie):
+            vista[col] = serie_entera(serie)
+    return pd.DataFrame(vista, copy = False)
+
+
+# Función que calcula cuántas filas se validan a la vez para no superar el presupuesto de memoria
+def filas_por_bloque(data: pd.DataFrame, guia_validacion: dict, columnas: List[str], memory_budget: Optional[int] = None) -> int:
+    '''
+    Calcula el número de filas que se validan a la vez.
+
+    La memoria de la validación es la del resultado (un byte por fila y columna validada más BYTES_SALIDA_FILA) más la
+    memoria de trabajo, que crece con el número de filas del bloque: las columnas convertidas a entero
+    (BYTES_COLUMNA_ENTERA por fila) y los arreglos temporales de la regla que se está validando (BYTES_TEMPORALES_FILA
+    por fila). Los datos de entrada no se cuentan porque la validación no los copia. Si los bloques que caben en el
+    presupuesto tienen menos de FILAS_MINIMAS_BLOQUE filas se emite una advertencia, porque la validación será lenta.
+
+    Args:
+        data (pd.DataFrame): DataFrame de datos.
+        guia_validacion (dict): Malla de validación.
+        columnas (List[str]): Columnas a validar.
+        memory_budget (Optional[int]): Memoria máxima en bytes, None para validar todas las filas a la vez.
+
+    Returns:
+        int: Número de filas por bloque.
+
+    Raises:
+        ValueError: Si el presupuesto no alcanza para el resultado y al menos una fila de trabajo.
+    '''
+    filas = len(data)
+    if memory_budget is None or filas == 0:
+        return max(filas, 1)
+    
+    numericas = set(columnas_enteras(guia_validacion, columnas)) | set(i for i in columnas if pd.api.types.is_numeric_dtype(data[i]))
+    por_fila = BYTES_COLUMNA_ENTERA * len(numericas) + BYTES_TEMPORALES_FILA
+    salida = (len(columnas) + BYTES_SALIDA_FILA) * filas
+    disponible = memory_budget - salida
+    if disponible >= por_fila * filas:
+        return filas
+    if disponible < por_fila:
+        raise ValueError("El presupuesto de memoria de {} bytes no alcanza para el resultado de la validación, se necesitan al menos {} bytes".format(
+            memory_budget, salida + por_fila))
+    
+    bloque = int(disponible // por_fila)
+    if bloque < FILAS_MINIMAS_BLOQUE:
+        warnings.warn("Con un presupuesto de memoria de {} bytes se valida en bloques de {} filas, la validación será lenta".format(memory_budget, bloque))
+    return bloque
+
+
+# Función para almacenar como categóricas las variables con una lista cerrada de valores
+def categorizar_valores(data: pd.DataFrame, guia_validacion: dict) -> pd.DataFrame:
+    '''
+    Convierte a tipo categórico las columnas de tipo 'str' o 'int' de la malla.
+
+    Las categorías son los valores permitidos por la malla, en su orden, seguidos de los demás valores observados en la
+    columna (fuera del dominio). Así no se pierde información y la validación de valores se reduce a revisar que el
+    código de la categoría sea menor al número de valores permitidos. Las columnas de tipo 'int' se convierten primero a
+    entero igual que en restore_type. Las columnas que no se pueden convertir se dejan sin cambios.
+    
+    El DataFrame de entrada no se modifica: el resultado es una copia superficial que comparte las columnas sin convertir,
+    pensada para la validación, de modo que los datos que se entregan al usuario conservan sus tipos.
+
+    Args:
+        data (pd.DataFrame): DataFrame de datos.
+        guia_validacion (dict): Malla de validación.
+
+    Returns:
+        pd.DataFrame: DataFrame con las columnas convertidas a tipo categórico.
+    '''
+    data = data.copy(deep = False)
+    for col in data.columns:
+        categorica = columna_categorica(col, data[col], guia_validacion)
+        if categorica is not None:
+            data[col] = categorica
     return data
 
 
-def malla_validacion(data: pd.DataFrame, guia_validacion: dict) -> Tuple[pd.DataFrame, List]:
+def columna_categorica(col: str, serie: pd.Series, guia_validacion: dict) -> Optional[pd.Series]:
+    '''
+    Convierte a tipo categórico una columna de tipo 'str' o 'int' de la malla (ver categorizar_valores).
+
+    Args:
+        col (str): Nombre de la columna.
+        serie (pd.Series): Columna.
+        guia_validacion (dict): Malla de validación.
+
+    Returns:
+        Optional[pd.Series]: Columna de tipo categórico, None si la columna no se convierte.
+    '''
+    # Las columnas de identificación y de edad se comparan por valor, por lo que se mantienen sin cambios
+    excluidas = ['id', 'NUMERODOCUMENTOTITULAR', 'num_documento']
+    
+    if col not in guia_validacion or col in excluidas or 'Edad' in col:
+        return None
+    valores = guia_validacion[col]['valores']
+    if valores is None or valores['Tipo'] not in ['str', 'int'] or isinstance(serie.dtype, pd.CategoricalDtype):
+        return None
+    try:
+        if valores['Tipo'] == 'int':
+            serie = restore_type(serie.to_frame(), [col])[col]
+        permitidos = indice_valores_permitidos(valores['valor'])
+        observados = pd.Index(serie.dropna().unique())
+        fuera_de_dominio = observados[~observados.isin(permitidos)]
+        # Unir un índice vacío genera un FutureWarning de pandas en cada ejecución
+        categorias = permitidos.append(fuera_de_dominio) if len(fuera_de_dominio) else permitidos
+        return pd.Series(pd.Categorical(serie, categories = categorias), index = serie.index)
+    except (TypeError, ValueError):
+        return None
+
+
+# Función que ordena las variables obligatorias de la validación más económica a la más costosa
+def ordenar_por_costo(variables: List[str], guia_validacion: dict) -> List[str]:
+    '''
+    Ordena las variables según el costo de su validación de valores (sin valores, int y str, regex, list y listlist).
+
+    Args:
+        variables (List[str]): Lista de variables a ordenar.
+        guia_validacion (dict): Malla de validación.
+
+    Returns:
+        List[str]: Variables ordenadas, conservando el orden original entre variables del mismo costo.
+    '''
+    costo = {'regex': 1, 'list': 2, 'listlist': 2}
+    return sorted(variables, key = lambda i: costo.get((guia_validacion[i]['valores'] or {}).get('Tipo'), 0))
+
+
+# Función que valida una lista de columnas y guarda el resultado de cada una en el dataframe de resultados
+def validar_columnas(data: pd.DataFrame, guia_validacion: dict, a_revisar: List[str], store_file: Dict[str, np.ndarray], activos: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    '''
+    Valida cada columna de a_revisar según la malla y guarda en store_file 0 si el valor está correcto y 1 si está erroneo.
+
+    Args:
+        data (pd.DataFrame): DataFrame de datos con los tipos ya restaurados.
+        guia_validacion (dict): Malla de validación.
+        a_revisar (List[str]): Columnas a validar, en el orden en que se validan.
+        store_file (Dict[str, np.ndarray]): Arreglo de resultados de cada columna, ya creado con ceros y del largo de data.
+        Los resultados se escriben sobre estos arreglos.
+        activos (Optional[np.ndarray]): Registros que aún no tienen errores (modo fail_fast). Si se entrega, cada columna
+        se valida solo sobre estos registros y los registros con error dejan de revisarse.
+
+    Returns:
+        Optional[np.ndarray]: Registros sin errores al terminar, None si no se entregó activos.
+    '''
+    for col in a_revisar:
+        try:
+            if activos is not None:
+                # Si todos los registros ya tienen errores no hay nada más por revisar
+                if not activos.any():
+                    continue
+                # Se copian solo los registros sin errores y las columnas que usa la validación de la variable
+                necesarias = dependencias_regla(col, guia_validacion) + COLUMNAS_PTA
+                necesarias = [i for i in dict.fromkeys(necesarias) if i in data.columns]
+                datos = data.loc[activos, necesarias]
+            else:
+                datos = data
+            
+            # Se crean las condiciones y valores
+            condicion = crear_condicion(guia_validacion[col]['condicion'], datos, guia_validacion[col]['iand'], guia_validacion[col]['excluida_PTA'])
+            values = verificar_valores(guia_validacion[col]['valores'], datos, col)
+            
+            # Se verifica la consistencia de la variable según los valores y condiciones
+            resultado = validar_valor(condicion = condicion, values = values, col = col, data = datos).to_numpy()
+            
+            if activos is not None:
+                store_file[col][activos] = resultado
+                activos = activos & (store_file[col] == 0)
+            else:
+                store_file[col][:] = resultado
+        except Exception as e:
+            print("Problema para validar la columna {}".format(col))
+            print(e)
+    return activos
+
+
+def malla_validacion(data: pd.DataFrame, guia_validacion: dict, fail_fast: bool = False, memory_budget: Optional[int] = None) -> Tuple[pd.DataFrame, List]:
     """
     Realiza la validación de datos basada en la malla de validación.
 
+    Los datos no se copian: cada regla lee solo las columnas que usa y escribe su resultado en un arreglo creado una sola
+    vez para todas las variables.
+
     Args:
         - data (pd.DataFrame): DataFrame de datos a validar.
         - guia_validacion (dict): Malla de validación que especifica las condiciones y valores para cada columna.
+        - fail_fast (bool): Si es True, cada registro deja de revisarse en cuanto tiene un error en una variable obligatoria.
+        Las variables se revisan de la validación más económica a la más costosa y las opcionales no se revisan. La
+        separación entre registros correctos y erroneos no cambia, pero en Errores solo aparecen las variables revisadas.
+        - memory_budget (Optional[int]): Memoria máxima en bytes para la validación, sin contar los datos de entrada. Si
+        validar todas las filas a la vez la supera, las filas se validan por bloques (ver filas_por_bloque). El resultado no cambia.
 
     Returns:
         Tuple[pd.DataFrame, List]: Tupla con la validación de datos y con la lista de columnas a revisar
+
+    Raises:
+        ValueError: Si memory_budget no alcanza para el resultado de la validación.
     """
+    # Filtrar columnas relevantes según la guía de validación
+    columnas = [i for i in data.columns if i in guia_validacion.keys()]
+    
+    # Las filas se validan por bloques si se supera el presupuesto de memoria, si el presupuesto no alcanza se lanza el error
+    filas = filas_por_bloque(data, guia_validacion, columnas, memory_budget)
+    
     try:
-        # Filtrar columnas relevantes según la guía de validación
-        columnas = [i for i in data.columns if i in guia_validacion.keys()]
-        data = data[columnas]
+        enteras = columnas_enteras(guia_validacion, columnas)
         
-        # Identificar columnas numéricas y convertirlas a tipo entero si es posible
-        try:
-            numeric = [n for n in [m for m in [i for i in guia_validacion.keys() if guia_validacion[i]['valores'] is not None] if guia_validacion[m]['valores']['Tipo'] == 'int'] if n in columnas]
-        except Exception as e:
-            print('Problemas con la malla de validación entregada')
-            print(e)
-        data = restore_type(data, numeric)
+        # Se identifican las variables obligatorias
+        obligatorias = [i for i in guia_validacion.keys() if guia_validacion[i]['opcional']== False]
+        obligatorias = [i for i in obligatorias if i in columnas]
         
-        # Crear una copia del DataFrame original
-        store_file = data.copy()
+        # Variables que identifican los registros, con los tipos restaurados
+        identificacion = vista_columnas(data, ['id', 'NUMERODOCUMENTOTITULAR', 'num_documento'], enteras)
         
-        # Realizar validación para cada columna según la malla de validación
-        for col in columnas:
-            try:
-                # Se crean las condiciones y valores
-                condicion = crear_condicion(guia_validacion[col]['condicion'], data, guia_validacion[col]['iand'], guia_validacion[col]['excluida_PTA'])
-                values = verificar_valores(guia_validacion[col]['valores'], data, col)
-                
-                # Se verifica la consistencia de la variable según los valores y condiciones
-                store_file[col] = validar_valor(condicion = condicion, values = values, col = col, data = data, file = store_file)
-            except Exception as e:
-                print("Problema para validar la columna {}".format(col))
-                print(e)
+        # Se añade la validación de número de documento duplicado
+        duplicado = identificacion['num_documento'].duplicated().to_numpy()
+        
+        # Resultado de todas las variables creado una sola vez, cada variable ocupa una fila contigua del arreglo
+        errores = np.zeros((len(columnas), len(data)), dtype = np.int8)
+        store_file = {col: errores[i] for i, col in enumerate(columnas)}
+        
+        for inicio in range(0, len(data), filas):
+            fin = inicio + filas
+            bloque = data if filas >= len(data) else data.iloc[inicio:fin]
+            vista = vista_columnas(bloque, columnas, enteras)
+            resultado_bloque = {col: valores[inicio:fin] for col, valores in store_file.items()}
             
-        # Se identifican las variables obligatorias
+            # En modo fail_fast se revisan solo las obligatorias, primero las de validación más económica, y únicamente sobre los registros sin errores
+            if fail_fast:
+                validar_columnas(vista, guia_validacion, ordenar_por_costo(obligatorias, guia_validacion), resultado_bloque, activos = ~duplicado[inicio:fin])
+            else:
+                validar_columnas(vista, guia_validacion, columnas, resultado_bloque)
+        
+        return construir_salida(errores, columnas, obligatorias, identificacion, duplicado)
+    except Exception as e:
+        # Manejo de excepciones para identificar y manejar errores específicos
+        print("Error al realizar la validación de datos basada en la malla de validación.")
+        print(e)
+
+
+def construir_salida(errores: np.ndarray, columnas: List[str], obligatorias: List[str], identificacion: pd.DataFrame, duplicado: np.ndarray) -> Tuple[pd.DataFrame, List]:
+    """
+    Construye el resultado de la validación sobre el arreglo de resultados, sin copiarlo.
+
+    Args:
+        - errores (np.ndarray): Arreglo de resultados con una fila por variable de columnas y una columna por registro.
+        - columnas (List[str]): Variables validadas.
+        - obligatorias (List[str]): Variables obligatorias, se les añade Documento_Duplicado.
+        - identificacion (pd.DataFrame): Variables id, NUMERODOCUMENTOTITULAR y num_documento de cada registro.
+        - duplicado (np.ndarray): Registros con número de documento duplicado.
+
+    Returns:
+        Tuple[pd.DataFrame, List]: Tupla con la validación de datos y con la lista de columnas a revisar
+    """
+    # Se realiza la suma de los errores para cada registro del dataframe, variable por variable para no copiar el arreglo
+    validacion = duplicado.astype(np.int64)
+    for col in obligatorias:
+        validacion += errores[columnas.index(col)]
+    
+    # Las variables que identifican los registros, los errores de cada variable y la validación se unen sin copiarlos.
+    # Insertar las columnas en el DataFrame o unirlo con concat las copia y el resultado ocuparía el doble de memoria
+    store_file = {'ID_HOGAR': identificacion['id'], 'NUM_TITULAR': identificacion['NUMERODOCUMENTOTITULAR'],
+                  'NUM_DOC_INTEGRANTE': identificacion['num_documento']}
+    store_file.update((col, errores[i]) for i, col in enumerate(columnas))
+    store_file.update(Documento_Duplicado = duplicado.astype(np.int8), Validacion = validacion)
+    store_file = pd.DataFrame(store_file, index = identificacion.index, copy = False)
+    
+    obligatorias.append('Documento_Duplicado')
+    
+    return store_file, obligatorias
+
+
+def columnas_enteras(guia_validacion: dict, columnas: List[str]) -> List[str]:
+    """
+    Identifica las columnas que la malla define como de tipo entero.
+
+    Args:
+        - guia_validacion (dict): Malla de validación.
+        - columnas (List[str]): Columnas presentes en los datos.
+
+    Returns:
+        List[str]: Columnas de tipo 'int' presentes en los datos.
+    """
+    try:
+        return [n for n in [m for m in [i for i in guia_validacion.keys() if guia_validacion[i]['valores'] is not None] if guia_validacion[m]['valores']['Tipo'] == 'int'] if n in columnas]
+    except Exception as e:
+        print('Problemas con la malla de validación entregada')
+        print(e)
+        return []
+
+
+def nivel_regla(col: str, guia_validacion: dict, columnas_integrante: List[str]) -> str:
+    """
+    Clasifica una regla de la malla según el nivel de los datos que usa.
+
+    Una regla es de hogar si ni la variable ni las variables de sus condiciones y valores (incluidas las de la verificación general
+    cuando la variable no la excluye) son del integrante.
+
+    Args:
+        - col (str): Variable de la regla.
+        - guia_validacion (dict): Malla de validación.
+        - columnas_integrante (List[str]): Columnas de la tabla de integrantes.
+
+    Returns:
+        str: 'hogar' o 'integrante'.
+    """
+    dependencias = dependencias_regla(col, guia_validacion)
+    if not guia_validacion[col]['excluida_PTA']:
+        dependencias += COLUMNAS_PTA
+    return 'integrante' if any(i in columnas_integrante for i in dependencias) else 'hogar'
+
+
+def malla_validacion_normalizada(hogares: pd.DataFrame, integrantes: pd.DataFrame, guia_validacion: dict, fail_fast: bool = False) -> Tuple[pd.DataFrame, List]:
+    """
+    Realiza la validación de datos sobre las tablas de hogares e integrantes sin repetir el hogar en cada integrante.
+
+    Las reglas de hogar se evalúan una vez por hogar sobre la tabla de hogares. Las reglas de integrante se evalúan sobre
+    la tabla de integrantes, a la que solo se le añaden las columnas del hogar que esas reglas usan. Los resultados del
+    hogar se repiten en cada integrante únicamente al construir la salida, que tiene la misma forma que la de malla_validacion.
+
+    Args:
+        - hogares (pd.DataFrame): Tabla de hogares, una fila por registro del Sincronizador.
+        - integrantes (pd.DataFrame): Tabla de integrantes, con la columna fila_hogar que indica la fila del hogar.
+        - guia_validacion (dict): Malla de validación que especifica las condiciones y valores para cada columna.
+        - fail_fast (bool): Si es True, un hogar con error en una regla de hogar deja de revisarse, y cada integrante deja
+        de revisarse en su primer error (ver malla_validacion).
+
+    Returns:
+        Tuple[pd.DataFrame, List]: Tupla con la validación de datos por integrante y con la lista de columnas a revisar
+    """
+    try:
+        # Filtrar columnas relevantes según la guía de validación
+        columnas_integrante = [i for i in integrantes.columns if i in guia_validacion.keys()]
+        columnas_hogar = [i for i in hogares.columns if i in guia_validacion.keys() and i not in columnas_integrante]
+        columnas = columnas_hogar + columnas_integrante
+        posiciones = integrantes['fila_hogar'].to_numpy()
+        
+        # Se clasifican las reglas según su nivel
+        reglas_hogar = [i for i in columnas_hogar if nivel_regla(i, guia_validacion, columnas_integrante) == 'hogar']
+        reglas_integrante = [i for i in columnas if i not in reglas_hogar]
+        
         obligatorias = [i for i in guia_validacion.keys() if guia_validacion[i]['opcional']== False]
-        obligatorias = [i for i in obligatorias if i in store_file.columns]
+        obligatorias = [i for i in obligatorias if i in columnas]
         
-        # Se añade la validación de número de documento duplicado
-        store_file['Documento_Duplicado'] = data['num_documento'].duplicated().astype(int)
+        # Tabla de hogares con los tipos restaurados, sin copiar los datos
+        data_hogar = vista_columnas(hogares, columnas_hogar, columnas_enteras(guia_validacion, columnas_hogar))
+        errores_hogar = np.zeros((len(columnas_hogar), len(data_hogar)), dtype = np.int8)
+        resultado_hogar = {col: errores_hogar[i] for i, col in enumerate(columnas_hogar)}
+        
+        # Tabla de integrantes con las columnas del hogar que usan las reglas de integrante
+        necesarias_hogar = []
+        for col in reglas_integrante:
+            necesarias_hogar += dependencias_regla(col, guia_validacion)
+        necesarias_hogar = [i for i in dict.fromkeys(necesarias_hogar + COLUMNAS_PTA) if i in columnas_hogar]
+        data_integrante = vista_columnas(integrantes, columnas_integrante, columnas_enteras(guia_validacion, columnas_integrante))
+        for col in necesarias_hogar:
+            data_integrante[col] = data_hogar[col].iloc[posiciones].reset_index(drop = True)
+        errores_integrante = np.zeros((len(columnas), len(data_integrante)), dtype = np.int8)
+        resultado_integrante = {col: errores_integrante[i] for i, col in enumerate(columnas)}
+        
+        duplicado = data_integrante['num_documento'].duplicated()
         
-        # Se agregan variables que permiten identificar los registros que están correctos o erroneos
-        id_hogar = data['id']
-        num_doc_representante = data['NUMERODOCUMENTOTITULAR']
-        num_doc_integrante = data['num_documento']
-        store_file.insert(0, 'ID_HOGAR', id_hogar)
-        store_file.insert(1,'NUM_TITULAR', num_doc_representante)
-        store_file.insert(2,'NUM_DOC_INTEGRANTE', num_doc_integrante)
+        if fail_fast:
+            activos_hogar = validar_columnas(data_hogar, guia_validacion, ordenar_por_costo([i for i in obligatorias if i in reglas_hogar], guia_validacion),
+                                             resultado_hogar, activos = np.ones(len(data_hogar), dtype = bool))
+            validar_columnas(data_integrante, guia_validacion, ordenar_por_costo([i for i in obligatorias if i in reglas_integrante], guia_validacion),
+                             resultado_integrante, activos = activos_hogar[posiciones] & ~duplicado.to_numpy())
+        else:
+            validar_columnas(data_hogar, guia_validacion, reglas_hogar, resultado_hogar)
+            validar_columnas(data_integrante, guia_validacion, reglas_integrante, resultado_integrante)
         
-        obligatorias.append('Documento_Duplicado')
+        # Se obtiene una columna por integrante, repitiendo el valor del hogar si la columna es del hogar
+        def por_integrante(col: str) -> pd.Series:
+            if col in data_integrante.columns:
+                return data_integrante[col]
+            if col in data_hogar.columns:
+                return data_hogar[col].iloc[posiciones].reset_index(drop = True)
+            if col in integrantes.columns:
+                return integrantes[col].reset_index(drop = True)
+            return hogares[col].iloc[posiciones].reset_index(drop = True)
         
-        # Se realiza la suma de los errores para cada registro del dataframe
-        store_file['Validacion'] = store_file[obligatorias].sum(axis = 1)
+        # Se repiten en cada integrante los resultados de las reglas de hogar, escribiéndolos en el arreglo de resultados
+        for col in reglas_hogar:
+            errores_integrante[columnas.index(col)] = resultado_hogar[col][posiciones]
         
-        return store_file, obligatorias
+        # Se construye la salida por integrante sobre el arreglo de resultados
+        identificacion = pd.DataFrame({col: por_integrante(col) for col in ['id', 'NUMERODOCUMENTOTITULAR', 'num_documento']}, copy = False)
+        return construir_salida(errores_integrante, columnas, obligatorias, identificacion, duplicado.to_numpy())
     except Exception as e:
         # Manejo de excepciones para identificar y manejar errores específicos
         print("Error al realizar la validación de datos basada en la malla de validación.")
@@ -430,6 +935,103 @@ def malla_validacion(data: pd.DataFrame, guia_validacion: dict) -> Tuple[pd.Data
 
 
 
+# Función que identifica una regla de la malla por su contenido
+def clave_regla(col: str, guia_validacion: dict) -> str:
+    """
+    Crea la clave de la regla de una variable a partir de la variable, su condición, sus valores, iand y excluida_PTA.
+
+    Dos mallas con la misma clave para una variable tienen la misma regla, sin importar si la variable es opcional.
+
+    Args:
+        - col (str): Variable de la regla.
+        - guia_validacion (dict): Malla de validación.
+
+    Returns:
+        str: Clave de la regla.
+    """
+    regla = guia_validacion[col]
+    return json.dumps([col, regla['condicion'], regla['valores'], regla['iand'], regla['excluida_PTA']], sort_keys = True, ensure_ascii = False, default = str)
+
+
+def malla_validacion_multiple(data: pd.DataFrame, guias_validacion: Dict[str, dict]) -> Tuple[Dict[str, Tuple[pd.DataFrame, List]], Dict[str, int]]:
+    """
+    Realiza la validación de los mismos datos con varias mallas de validación evaluando una sola vez las reglas que se repiten.
+
+    Cada columna se convierte una sola vez a cada tipo que piden las mallas (original, entero o categórica con los valores de
+    la malla, ver categorizar_valores y restore_type). Una regla se evalúa una sola vez si su clave (ver clave_regla) y
+    el tipo de las columnas que usa son iguales en varias mallas, y su resultado se copia en la salida de cada malla. El
+    resultado de cada malla es el mismo que el de malla_validacion sobre los datos categorizados con esa malla. No hay
+    modo fail_fast, porque los registros que quedan por revisar son distintos en cada malla.
+
+    Args:
+        - data (pd.DataFrame): DataFrame de datos a validar, ya expandido y sin categorizar.
+        - guias_validacion (Dict[str, dict]): Mallas de validación por nombre.
+
+    Returns:
+        Tuple[Dict[str, Tuple[pd.DataFrame, List]], Dict[str, int]]: Resultado de malla_validacion para cada malla y número de
+        reglas de todas las mallas ('reglas') y de reglas evaluadas ('reglas_evaluadas')
+    """
+    # Columnas convertidas, se guardan por variable y tipo para compartirlas entre mallas
+    convertidas = {}
+    def tipo_columna(col: str, guia_validacion: dict, enteras: List[str]) -> str:
+        if col in guia_validacion and guia_validacion[col]['valores'] is not None:
+            tipo = 'categoria ' + json.dumps(guia_validacion[col]['valores'], sort_keys = True, ensure_ascii = False, default = str)
+            if (col, tipo) not in convertidas:
+                convertidas[(col, tipo)] = columna_categorica(col, data[col], guia_validacion)
+            if convertidas[(col, tipo)] is not None:
+                return tipo
+        # Las mismas columnas que convierte restore_type: las numéricas y las que la malla define como numéricas
+        serie = data[col]
+        numerica = pd.api.types.is_numeric_dtype(serie.dtype) and not pd.api.types.is_bool_dtype(serie.dtype)
+        if (numerica or col in enteras) and es_restaurable(col, serie):
+            if (col, 'entero') not in convertidas:
+                convertidas[(col, 'entero')] = serie_entera(serie)
+            return 'entero'
+        return 'original'
+    def columna(col: str, tipo: str) -> pd.Series:
+        return data[col] if tipo == 'original' else convertidas[(col, tipo)]
+    
+    evaluadas = {}
+    salidas = {}
+    reglas = 0
+    for nombre, guia_validacion in guias_validacion.items():
+        try:
+            # Filtrar columnas relevantes según la guía de validación y definir el tipo de cada una
+            columnas = [i for i in data.columns if i in guia_validacion.keys()]
+            enteras = columnas_enteras(guia_validacion, columnas)
+            tipos = {col: tipo_columna(col, guia_validacion, enteras) for col in columnas}
+            
+            obligatorias = [i for i in guia_validacion.keys() if guia_validacion[i]['opcional']== False]
+            obligatorias = [i for i in obligatorias if i in columnas]
+            
+            errores = np.zeros((len(columnas), len(data)), dtype = np.int8)
+            for i, col in enumerate(columnas):
+                # Columnas que usa la regla con su tipo en esta malla
+                necesarias = [j for j in dict.fromkeys(dependencias_regla(col, guia_validacion) + COLUMNAS_PTA) if j in columnas]
+                clave = (clave_regla(col, guia_validacion), tuple((j, tipos[j]) for j in necesarias))
+                
+                # La regla se evalúa solo la primera vez que aparece
+                if clave not in evaluadas:
+                    datos = pd.DataFrame({j: columna(j, tipos[j]) for j in necesarias}, copy = False)
+                    resultado = {col: np.zeros(len(data), dtype = np.int8)}
+                    validar_columnas(datos, guia_validacion, [col], resultado)
+                    evaluadas[clave] = resultado[col]
+                errores[i] = evaluadas[clave]
+            reglas += len(columnas)
+            
+            # Variables que identifican los registros, con los tipos restaurados
+            identificacion = pd.DataFrame({col: columna(col, tipo_columna(col, {}, enteras)) for col in ['id', 'NUMERODOCUMENTOTITULAR', 'num_documento']}, copy = False)
+            duplicado = identificacion['num_documento'].duplicated().to_numpy()
+            
+            salidas[nombre] = construir_salida(errores, columnas, obligatorias, identificacion, duplicado)
+        except Exception as e:
+            # Manejo de excepciones para identificar y manejar errores específicos
+            print("Error al realizar la validación de datos basada en la malla de validación {}.".format(nombre))
+            print(e)
+    
+    return salidas, {'reglas': reglas, 'reglas_evaluadas': len(evaluadas)}
+
+
 def concatenate_Errores(row: pd.Series, cols_obligatorias: List[str]) -> str:
     '''
     Concatena los nombres de las columnas que contienen errores en una fila.
@@ -450,19 +1052,46 @@ def concatenate_Errores(row: pd.Series, cols_obligatorias: List[str]) -> str:
     return ', '.join(errores) if row['Validacion'] > 0 else np.nan
 
 
-def resultados_malla_de_validacion(data: pd.DataFrame, guia_de_validacion:dict)-> Tuple[pd.DataFrame, pd.DataFrame]:
-    """Función que ejecuta la malla de validación y retorna los resultados de la validación.
+def marcar_documentos_previos(dataframe_validado: pd.DataFrame, documentos_previos: set) -> pd.DataFrame:
+    """Marca como duplicados los documentos de un lote validado que ya aparecieron en lotes anteriores.
+
+    La regla es la de duplicated() en la validación completa: un documento vacío está repetido si antes apareció un
+    documento vacío del mismo tipo (None, NaN o NA).
 
     Args:
-        data (pd.DataFrame): Dataframe sobre el cual se va a realizar la validación.
-        guia_de_validacion (dict): Malla de validación que especifica las condiciones y valores para cada columna.
+        dataframe_validado (pd.DataFrame): Resultado de la función malla_validacion para un lote.
+        documentos_previos (set): Números de documento de los lotes anteriores y una marca ('vacio', tipo) por cada tipo
+        de documento vacío, se actualiza con los documentos del lote.
 
     Returns:
-        Validos, No_Validos: Tupla con el dataframe de participantes con valores correctos y el dataframe de participantes con valores erroneos.
+        pd.DataFrame: Dataframe validado con la validación de documento duplicado y la suma de errores actualizadas.
     """
-    print("MALLA DE VALIDACIÓN")
-    dataframe_validado, cols_obligatorias = malla_validacion(data=data, guia_validacion=guia_de_validacion)
+    documentos = dataframe_validado['NUM_DOC_INTEGRANTE']
+    vacios = documentos.isna().to_numpy()
+    marcas = [('vacio', type(documento).__name__) for documento in documentos[vacios]]
+    previo = documentos.isin(documentos_previos).to_numpy().copy()
+    previo[vacios] = [marca in documentos_previos for marca in marcas]
+    
+    # Solo se suma el error a los registros que no estaban marcados como duplicados dentro del mismo lote
+    previo &= dataframe_validado['Documento_Duplicado'].to_numpy() == 0
+    dataframe_validado.loc[previo, 'Documento_Duplicado'] = 1
+    dataframe_validado.loc[previo, 'Validacion'] += 1
     
+    documentos_previos.update(documentos[~vacios])
+    documentos_previos.update(marcas)
+    return dataframe_validado
+
+
+def separar_resultados(dataframe_validado: pd.DataFrame, cols_obligatorias: List[str])-> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Función que separa el dataframe validado en participantes con valores correctos y con valores erroneos.
+
+    Args:
+        dataframe_validado (pd.DataFrame): Resultado de la función malla_validacion.
+        cols_obligatorias (List[str]): Lista de columnas obligatorias que se revisaron.
+
+    Returns:
+        Validos, No_Validos: Tupla con el dataframe de participantes con valores correctos y el dataframe de participantes con valores erroneos.
+    """
     dataframe_validado['Errores'] = dataframe_validado.apply(concatenate_Errores, args=(cols_obligatorias,), axis=1)
     
     resultados = dataframe_validado.groupby(by=['ID_HOGAR','NUM_TITULAR','NUM_DOC_INTEGRANTE'], as_index=False).agg({'Validacion':'sum'})
@@ -476,15 +1105,243 @@ def resultados_malla_de_validacion(data: pd.DataFrame, guia_de_validacion:dict)-
     valid = data_sin_errores.merge(dataframe_validado,
                                    on=['ID_HOGAR','NUM_TITULAR','NUM_DOC_INTEGRANTE'], 
                                    how='left')[['ID_HOGAR','NUM_TITULAR','NUM_DOC_INTEGRANTE','Validacion','Errores']]
-    
-    # Imprimir resultados
+    return valid, novalid
+
+
+def imprimir_resultados(valid: pd.DataFrame, novalid: pd.DataFrame, total_participantes: int, total_hogares: int):
+    """Función que imprime el resumen de la malla de validación.
+
+    Args:
+        valid (pd.DataFrame): Participantes con valores correctos.
+        novalid (pd.DataFrame): Participantes con valores erroneos.
+        total_participantes (int): Número total de registros validados.
+        total_hogares (int): Número total de hogares validados.
+    """
     print("RESULTADOS MALLA DE VALIDACIÓN")
-    print("El número total de elementos validados fueron {} participantes que equivale a {} Hogares".format(len(dataframe_validado), dataframe_validado['ID_HOGAR'].nunique()))
+    print("El número total de elementos validados fueron {} participantes que equivale a {} Hogares".format(total_participantes, total_hogares))
     print("="*100)
     print("El número total de participantes con valores correctos es {} que equivale a {} hogares".format(len(valid),valid['ID_HOGAR'].nunique()))
     print("="*100)
     print("El número total de participantes con valores erroneos es {} que equivale a {} hogares".format(len(novalid),novalid['ID_HOGAR'].nunique()))
+
+
+def resultados_malla_de_validacion(data: pd.DataFrame, guia_de_validacion:dict, fail_fast: bool = False, memory_budget: Optional[int] = None)-> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Función que ejecuta la malla de validación y retorna los resultados de la validación.
+
+    Args:
+        data (pd.DataFrame): Dataframe sobre el cual se va a realizar la validación.
+        guia_de_validacion (dict): Malla de validación que especifica las condiciones y valores para cada columna.
+        fail_fast (bool): Si es True, cada registro deja de revisarse en su primer error (ver malla_validacion).
+        memory_budget (Optional[int]): Memoria máxima en bytes para la validación, si se supera se valida por bloques de filas (ver malla_validacion).
+
+    Returns:
+        Validos, No_Validos: Tupla con el dataframe de participantes con valores correctos y el dataframe de participantes con valores erroneos.
+    """
+    print("MALLA DE VALIDACIÓN")
+    dataframe_validado, cols_obligatorias = malla_validacion(data=data, guia_validacion=guia_de_validacion, fail_fast=fail_fast, memory_budget=memory_budget)
+    
+    valid, novalid = separar_resultados(dataframe_validado, cols_obligatorias)
+    
+    # Imprimir resultados
+    imprimir_resultados(valid, novalid, len(dataframe_validado), dataframe_validado['ID_HOGAR'].nunique())
     
     return valid, novalid
+
+
+def tasas_de_error(dataframe_validado: pd.DataFrame, cols_obligatorias: List[str], estrato_hogar: pd.Series, tamanos: Dict, nivel_confianza: float = 0.95)-> pd.DataFrame:
+    """Función que estima, a partir de una muestra estratificada de hogares, la proporción de hogares con error en cada variable.
+
+    El estimador pondera cada estrato por su tamaño en la población e incluye la corrección por población finita. El
+    intervalo de confianza es el de Wilson calculado con el tamaño de muestra efectivo del diseño.
+
+    Args:
+        dataframe_validado (pd.DataFrame): Resultado de la función malla_validacion sobre la muestra.
+        cols_obligatorias (List[str]): Lista de columnas obligatorias que se revisaron.
+        estrato_hogar (pd.Series): Número de estrato de cada hogar de la muestra, indexado por el id del hogar. Puede tener ids repetidos.
+        tamanos (Dict): Diccionario con el número de hogares en la población ('poblacion') y en la muestra ('muestra') por estrato.
+        nivel_confianza (float): Nivel de confianza del intervalo.
+
+    Returns:
+        pd.DataFrame: Tasa de error estimada e intervalo de confianza por variable, ordenado de mayor a menor tasa.
+    """
+    z = NormalDist().inv_cdf((1 + nivel_confianza) / 2)
+    
+    # Un hogar tiene error en una variable si al menos uno de sus integrantes lo tiene
+    columnas = cols_obligatorias + ['Validacion']
+    por_hogar = (dataframe_validado.groupby('ID_HOGAR')[columnas].max() > 0).astype(int)
+    por_hogar = por_hogar.rename(columns = {'Validacion': 'Hogar_Con_Errores'})
+    # Los registros con el mismo id se agrupan como un solo hogar, que queda en el estrato del primero
+    estrato_hogar = estrato_hogar[~estrato_hogar.index.duplicated()]
+    por_hogar['Estrato'] = por_hogar.index.map(estrato_hogar)
+    
+    total_poblacion = sum(tamanos['poblacion'].values())
+    n_muestra = len(por_hogar)
+    proporciones = por_hogar.groupby('Estrato').mean()
+    
+    filas = []
+    for variable in proporciones.columns:
+        p, varianza = 0.0, 0.0
+        for estrato, p_h in proporciones[variable].items():
+            N_h = tamanos['poblacion'][estrato]
+            n_h = tamanos['muestra'][estrato]
+            W_h = N_h / total_poblacion
+            p += W_h * p_h
+            if n_h > 1:
+                varianza += W_h ** 2 * (1 - n_h / N_h) * p_h * (1 - p_h) / (n_h - 1)
+        
+        # Tamaño de muestra efectivo del diseño estratificado para el intervalo de Wilson
+        n_efectivo = p * (1 - p) / varianza if varianza > 0 else n_muestra
+        centro = (p + z ** 2 / (2 * n_efectivo)) / (1 + z ** 2 / n_efectivo)
+        margen = z / (1 + z ** 2 / n_efectivo) * np.sqrt(p * (1 - p) / n_efectivo + z ** 2 / (4 * n_efectivo ** 2))
+        filas.append({
+            'Variable': variable,
+            'Hogares_Muestra': n_muestra,
+            'Hogares_Con_Error': int(por_hogar[variable].sum()),
+            'Tasa_Error': p,
+            'Limite_Inferior': max(0.0, centro - margen),
+            'Limite_Superior': min(1.0, centro + margen),
+            })
+    
+    return pd.DataFrame(filas).sort_values('Tasa_Error', ascending = False, kind = 'stable').reset_index(drop = True)
+
+
+def unir_resultados_lotes(resultados: Iterable[Tuple[pd.DataFrame, List]])-> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Función que une los resultados de la malla de validación de varios lotes en el orden en que se entregan.
+
+    La validación de documento duplicado se completa entre lotes antes de separar los resultados.
+
+    Args:
+        resultados (Iterable[Tuple[pd.DataFrame, List]]): Resultados de la función malla_validacion para cada lote.
+
+    Returns:
+        Validos, No_Validos: Tupla con el dataframe de participantes con valores correctos y el dataframe de participantes con valores erroneos.
+    """
+    documentos_previos = set()
+    validos, novalidos = [], []
+    total_participantes = 0
+    hogares = set()
+    
+    for dataframe_validado, cols_obligatorias in resultados:
+        dataframe_validado = marcar_documentos_previos(dataframe_validado, documentos_previos)
+        valid, novalid = separar_resultados(dataframe_validado, cols_obligatorias)
+        validos.append(valid)
+        novalidos.append(novalid)
+        total_participantes += len(dataframe_validado)
+        hogares.update(dataframe_validado['ID_HOGAR'].dropna())
+    
+    columnas = ['ID_HOGAR','NUM_TITULAR','NUM_DOC_INTEGRANTE','Validacion','Errores']
+    valid = pd.concat(validos, ignore_index=True) if validos else pd.DataFrame(columns=columnas)
+    novalid = pd.concat(novalidos, ignore_index=True) if novalidos else pd.DataFrame(columns=columnas)
+    
+    imprimir_resultados(valid, novalid, total_participantes, len(hogares))
+    
+    return valid, novalid
+
+
+def resultados_malla_de_validacion_normalizada(hogares: pd.DataFrame, integrantes: pd.DataFrame, guia_de_validacion: dict, fail_fast: bool = False)-> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Función que ejecuta la malla de validación sobre las tablas de hogares e integrantes y retorna los resultados de la validación.
+
+    Args:
+        hogares (pd.DataFrame): Tabla de hogares.
+        integrantes (pd.DataFrame): Tabla de integrantes, con la columna fila_hogar.
+        guia_de_validacion (dict): Malla de validación que especifica las condiciones y valores para cada columna.
+        fail_fast (bool): Si es True, cada hogar o integrante deja de revisarse en su primer error.
+
+    Returns:
+        Validos, No_Validos: Tupla con el dataframe de participantes con valores correctos y el dataframe de participantes con valores erroneos.
+    """
+    print("MALLA DE VALIDACIÓN")
+    dataframe_validado, cols_obligatorias = malla_validacion_normalizada(hogares, integrantes, guia_de_validacion, fail_fast = fail_fast)
+    
+    valid, novalid = separar_resultados(dataframe_validado, cols_obligatorias)
+    
+    imprimir_resultados(valid, novalid, len(dataframe_validado), dataframe_validado['ID_HOGAR'].nunique())
+    
+    return valid, novalid
+
+
+def resultados_malla_de_validacion_por_lotes(lotes: Iterable[pd.DataFrame], guia_de_validacion: dict)-> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Función que ejecuta la malla de validación sobre una secuencia de lotes y une los resultados.
+
+    Cada lote debe contener hogares completos. La validación de documento duplicado se mantiene entre lotes.
+
+    Args:
+        lotes (Iterable[pd.DataFrame]): Lotes de datos ya expandidos sobre los que se va a realizar la validación.
+        guia_de_validacion (dict): Malla de validación que especifica las condiciones y valores para cada columna.
+
+    Returns:
+        Validos, No_Validos: Tupla con el dataframe de participantes con valores correctos y el dataframe de participantes con valores erroneos.
+    """
+    print("MALLA DE VALIDACIÓN")
+    resultados = (malla_validacion(data=lote, guia_validacion=guia_de_validacion) for lote in lotes)
+    return unir_resultados_lotes(resultados)
+
+
+def diferencias_entre_mallas(resultados: Dict[str, Tuple[pd.DataFrame, pd.DataFrame]])-> pd.DataFrame:
+    """Función que identifica los participantes que cambian de estado (valido o no valido) entre mallas de validación.
+
+    Args:
+        resultados (Dict[str, Tuple[pd.DataFrame, pd.DataFrame]]): Datos validos y no validos de cada malla, en el orden de las versiones.
+
+    Returns:
+        pd.DataFrame: Participantes que no tienen el mismo estado en todas las mallas, con las columnas Valido_<malla> y Errores_<malla> de cada malla.
+    """
+    llaves = ['ID_HOGAR','NUM_TITULAR','NUM_DOC_INTEGRANTE']
+    estados = []
+    for nombre, (valid, novalid) in resultados.items():
+        estado = pd.concat([valid.assign(Valido = True), novalid.assign(Valido = False)], ignore_index = True)
+        estado = estado.drop_duplicates(subset = llaves).set_index(llaves)[['Valido', 'Errores']]
+        estados.append(estado.rename(columns = {'Valido': 'Valido_{}'.format(nombre), 'Errores': 'Errores_{}'.format(nombre)}))
+    
+    if not estados:
+        return pd.DataFrame(columns = llaves)
+    diferencias = pd.concat(estados, axis = 1, join = 'outer')
+    
+    # Un participante cambia de estado si no tiene el mismo estado en todas las mallas
+    columnas_estado = ['Valido_{}'.format(nombre) for nombre in resultados]
+    cambia = diferencias[columnas_estado].nunique(axis = 1, dropna = False) > 1
+    return diferencias[cambia].reset_index()
+
+
+def separar_resultados_mallas(validados: Dict[str, Tuple[pd.DataFrame, List]])-> Tuple[Dict[str, Tuple[pd.DataFrame, pd.DataFrame]], pd.DataFrame]:
+    """Función que separa los resultados de varias mallas de validación y compara los estados de los participantes entre mallas.
+
+    Args:
+        validados (Dict[str, Tuple[pd.DataFrame, List]]): Resultado de malla_validacion de cada malla, en el orden de las versiones.
+
+    Returns:
+        Tuple[Dict[str, Tuple[pd.DataFrame, pd.DataFrame]], pd.DataFrame]: Datos validos y no validos de cada malla, y participantes que cambian de estado entre mallas (ver diferencias_entre_mallas).
+    """
+    resultados = {}
+    for nombre, (dataframe_validado, cols_obligatorias) in validados.items():
+        print("MALLA DE VALIDACIÓN {}".format(nombre))
+        valid, novalid = separar_resultados(dataframe_validado, cols_obligatorias)
+        imprimir_resultados(valid, novalid, len(dataframe_validado), dataframe_validado['ID_HOGAR'].nunique())
+        resultados[nombre] = valid, novalid
+    
+    diferencias = diferencias_entre_mallas(resultados)
+    
+    # Se imprime el número de participantes que cambian de estado entre cada malla y la siguiente
+    nombres = list(resultados)
+    print("="*100)
+    for anterior, siguiente in zip(nombres, nombres[1:]):
+        cambian = diferencias['Valido_{}'.format(anterior)] != diferencias['Valido_{}'.format(siguiente)]
+        print("Entre las mallas {} y {} cambian de estado {} participantes".format(anterior, siguiente, int(cambian.sum())))
+    
+    return resultados, diferencias
+
+
+def resultados_malla_de_validacion_multiple(data: pd.DataFrame, guias_de_validacion: Dict[str, dict])-> Tuple[Dict[str, Tuple[pd.DataFrame, pd.DataFrame]], pd.DataFrame]:
+    """Función que ejecuta varias mallas de validación sobre los mismos datos, evaluando una sola vez las reglas que se repiten.
+
+    Args:
+        data (pd.DataFrame): Dataframe ya expandido y sin categorizar sobre el cual se va a realizar la validación.
+        guias_de_validacion (Dict[str, dict]): Mallas de validación por nombre, en el orden de las versiones.
+
+    Returns:
+        Tuple[Dict[str, Tuple[pd.DataFrame, pd.DataFrame]], pd.DataFrame]: Datos validos y no validos de cada malla, y participantes que cambian de estado entre mallas.
+    """
+    validados, reglas = malla_validacion_multiple(data, guias_de_validacion)
+    print("Se evaluaron {} reglas distintas de {} reglas en {} mallas".format(reglas['reglas_evaluadas'], reglas['reglas'], len(guias_de_validacion)))
     
-    
\ No newline at end of file
+    return separar_resultados_mallas(validados)